@@ -0,0 +1,37 @@
+"""cascade post deletion from users
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_constraint("posts_author_id_fkey", "posts", type_="foreignkey")
+    op.create_foreign_key(
+        "posts_author_id_fkey",
+        "posts",
+        "users",
+        ["author_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    # Without an index every cascaded delete scans the whole posts table
+    op.create_index(op.f("ix_posts_author_id"), "posts", ["author_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_posts_author_id"), table_name="posts")
+    op.drop_constraint("posts_author_id_fkey", "posts", type_="foreignkey")
+    op.create_foreign_key(
+        "posts_author_id_fkey", "posts", "users", ["author_id"], ["id"]
+    )
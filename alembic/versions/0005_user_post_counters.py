@@ -0,0 +1,47 @@
+"""denormalized post counters on users
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("post_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "users",
+        sa.Column("published_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "users", sa.Column("last_post_at", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.execute("""
+        UPDATE users SET
+            post_count = (SELECT count(*) FROM posts WHERE posts.author_id = users.id),
+            published_count = (
+                SELECT count(*) FROM posts
+                WHERE posts.author_id = users.id AND posts.published
+            ),
+            last_post_at = (
+                SELECT max(created_at) FROM posts WHERE posts.author_id = users.id
+            )
+        """)
+
+
+def downgrade() -> None:
+    op.drop_column("users", "last_post_at")
+    op.drop_column("users", "published_count")
+    op.drop_column("users", "post_count")
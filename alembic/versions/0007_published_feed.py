@@ -0,0 +1,57 @@
+"""materialized published feed
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "published_feed",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("author_id", sa.Integer(), nullable=False),
+        sa.Column("author_username", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "published_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("post_id"),
+    )
+    op.create_index(
+        op.f("ix_published_feed_author_id"),
+        "published_feed",
+        ["author_id"],
+        unique=False,
+    )
+    op.execute("""
+        INSERT INTO published_feed
+            (post_id, title, author_id, author_username, created_at, published_at)
+        SELECT posts.id, posts.title, posts.author_id, users.username,
+               posts.created_at, posts.created_at
+        FROM posts JOIN users ON users.id = posts.author_id
+        WHERE posts.published
+        ORDER BY posts.created_at, posts.id
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_published_feed_author_id"), table_name="published_feed")
+    op.drop_table("published_feed")
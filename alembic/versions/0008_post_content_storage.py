@@ -0,0 +1,78 @@
+"""post excerpts and binary, optionally compressed content
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+import zlib
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.models import make_excerpt
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+EXCERPT_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.add_column(
+        "posts", sa.Column("excerpt", sa.String(), server_default="", nullable=False)
+    )
+    # Same excerpts as new posts get, computed in batches by the app itself
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                "SELECT id, content FROM posts WHERE id > :last_id "
+                "ORDER BY id LIMIT :batch"
+            ),
+            {"last_id": last_id, "batch": EXCERPT_BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("UPDATE posts SET excerpt = :excerpt WHERE id = :id"),
+            [
+                {"id": post_id, "excerpt": make_excerpt(content)}
+                for post_id, content in rows
+            ],
+        )
+        last_id = rows[-1][0]
+    # Existing rows become plain UTF-8 bytes, which CompressedText reads as is
+    op.alter_column(
+        "posts",
+        "content",
+        type_=sa.LargeBinary(),
+        postgresql_using="convert_to(content, 'UTF8')",
+    )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.text(
+            "SELECT id, content FROM posts "
+            "WHERE substring(content from 1 for 1) = '\\x00'::bytea"
+        )
+    ).fetchall()
+    for post_id, content in rows:
+        conn.execute(
+            sa.text("UPDATE posts SET content = :content WHERE id = :id"),
+            {"content": zlib.decompress(bytes(content)[1:]), "id": post_id},
+        )
+    op.alter_column(
+        "posts",
+        "content",
+        type_=sa.Text(),
+        postgresql_using="convert_from(content, 'UTF8')",
+    )
+    op.drop_column("posts", "excerpt")
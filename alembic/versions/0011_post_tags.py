@@ -0,0 +1,38 @@
+"""post tags
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "post_tags",
+        sa.Column("tag", sa.String(length=50), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("tag", "post_id"),
+    )
+    op.create_index(
+        op.f("ix_post_tags_post_id"), "post_tags", ["post_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    # Left behind by `app.cli partition-posts`, which replaces the foreign key
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TRIGGER IF EXISTS posts_delete_tags ON posts")
+        op.execute("DROP FUNCTION IF EXISTS posts_delete_tags()")
+    op.drop_index(op.f("ix_post_tags_post_id"), table_name="post_tags")
+    op.drop_table("post_tags")
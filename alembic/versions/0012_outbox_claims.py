@@ -0,0 +1,27 @@
+"""claim outbox events per process
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "outbox_events",
+        sa.Column("claimed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("outbox_events", "claimed_at")
@@ -0,0 +1,31 @@
+"""shared id sequence for post stream events
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+
+import time
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # Start above the timestamp ids issued before, so Last-Event-ID values
+    # held by connected clients stay comparable
+    op.execute(f"CREATE SEQUENCE post_event_id_seq START WITH {time.time_ns() // 1000}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP SEQUENCE post_event_id_seq")
@@ -1,18 +1,28 @@
-from datetime import datetime, timedelta
-from typing import Optional
+import hashlib
+import math
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 
 import bcrypt as _bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import bindparam, delete, func, select, update
 from sqlalchemy.orm import Session
 
 from app.config import settings
 from app.database import get_db
-from app.models import User
+from app.models import RefreshToken, User
 from app.schemas import TokenData
 
+# Built once and shared with app.crud; only the parameter changes per call,
+# so SQLAlchemy reuses the compiled SQL from its statement cache
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+
 # Monkey patch to fix passlib/bcrypt compatibility issue
 # The wrap bug detection uses a 200-byte test string that exceeds bcrypt's 72-byte limit
 # Store original hashpw
@@ -55,6 +65,9 @@ except (ImportError, AttributeError):
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt cost used when timing the hardware; cheap enough to run a few times
+_CALIBRATION_ROUNDS = 8
+
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.api_v1_str}/auth/login")
 
@@ -69,13 +82,58 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def calibrate_bcrypt_rounds(
+    target_ms: float, min_rounds: int = 4, max_rounds: int = 31
+) -> int:
+    """Pick the bcrypt cost whose hashing time is closest to `target_ms`."""
+    salt = _bcrypt.gensalt(rounds=_CALIBRATION_ROUNDS)
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        _bcrypt.hashpw(b"calibration-password", salt)
+        elapsed = min(elapsed, (time.perf_counter() - start) * 1000)
+    # Every extra round doubles the work
+    rounds = _CALIBRATION_ROUNDS + round(math.log2(target_ms / max(elapsed, 1e-3)))
+    return max(min_rounds, min(max_rounds, rounds))
+
+
+def configure_password_hashing() -> int:
+    """Apply the configured (or calibrated) bcrypt cost to `pwd_context`.
+
+    Hashes outside the accepted cost window are reported by `needs_update`
+    and rehashed on the next successful login. A calibrated cost accepts one
+    round either side so workers timing slightly differently don't keep
+    rehashing each other's output.
+    """
+    if settings.bcrypt_rounds:
+        rounds = settings.bcrypt_rounds
+        window = 0
+    else:
+        rounds = calibrate_bcrypt_rounds(
+            settings.bcrypt_target_ms,
+            settings.bcrypt_min_rounds,
+            settings.bcrypt_max_rounds,
+        )
+        window = 1
+    pwd_context.update(
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=max(4, rounds - window),
+        bcrypt__max_rounds=min(31, rounds + window),
+    )
+    return rounds
+
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """Authenticate a user with username and password."""
-    user = db.query(User).filter(User.username == username).first()
+    """Authenticate a user, upgrading an outdated password hash on success."""
+    user = db.scalars(USER_BY_USERNAME, {"username": username}).first()
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = pwd_context.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
 
@@ -93,6 +151,124 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def _hash_refresh_token(token: str) -> str:
+    """Refresh tokens are random, so a fast digest is enough to store them."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _as_utc(value: datetime) -> datetime:
+    """SQLite hands back naive datetimes; treat them as UTC."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def create_refresh_token(
+    db: Session, user_id: int, family_id: Optional[str] = None
+) -> str:
+    """Issue a new refresh token for a user and store its hash."""
+    token = secrets.token_urlsafe(32)
+    db.add(
+        RefreshToken(
+            token_hash=_hash_refresh_token(token),
+            family_id=family_id or uuid.uuid4().hex,
+            user_id=user_id,
+            expires_at=datetime.now(timezone.utc)
+            + timedelta(days=settings.refresh_token_expire_days),
+        )
+    )
+    db.commit()
+    return token
+
+
+def revoke_refresh_token_family(db: Session, family_id: str) -> None:
+    """Revoke every live token issued from the same login."""
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None)
+    ).update({"revoked_at": datetime.now(timezone.utc)}, synchronize_session=False)
+    db.commit()
+
+
+def revoke_user_refresh_tokens(db: Session, user_id: int, commit: bool = True) -> None:
+    """Revoke every live refresh token belonging to a user.
+
+    With `commit=False` the revocation joins the caller's transaction.
+    """
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None)
+    ).update({"revoked_at": datetime.now(timezone.utc)}, synchronize_session=False)
+    if commit:
+        db.commit()
+
+
+def rotate_refresh_token(db: Session, token: str) -> Optional[Tuple[User, str]]:
+    """Exchange a refresh token for a new one.
+
+    Returns the owning user and the replacement token, or None when the token
+    is unknown, expired, revoked or belongs to an inactive user. Presenting a
+    token that was already rotated revokes its whole family, since either the
+    client or an attacker is replaying a stolen token. Concurrent refreshes
+    with one token race on a conditional UPDATE; the losers count as reuse.
+    """
+    db_token = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == _hash_refresh_token(token))
+        .first()
+    )
+    if db_token is None:
+        return None
+    if db_token.revoked_at is not None:
+        revoke_refresh_token_family(db, db_token.family_id)
+        return None
+    now = datetime.now(timezone.utc)
+    if _as_utc(db_token.expires_at) <= now or not db_token.user.is_active:
+        return None
+
+    rotated = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == db_token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+        .returning(RefreshToken.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if rotated is None:
+        revoke_refresh_token_family(db, db_token.family_id)
+        return None
+    new_token = create_refresh_token(db, db_token.user_id, db_token.family_id)
+    return db_token.user, new_token
+
+
+def purge_refresh_tokens(db: Session) -> int:
+    """Delete the refresh token families whose every token has expired.
+
+    Rotated and revoked tokens are kept while any token of their family can
+    still be used, so replaying them is detected as reuse until then.
+    """
+    dead_families = (
+        select(RefreshToken.family_id)
+        .group_by(RefreshToken.family_id)
+        .having(func.max(RefreshToken.expires_at) <= datetime.now(timezone.utc))
+    )
+    result = db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.family_id.in_(dead_families))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def revoke_refresh_token(db: Session, token: str) -> bool:
+    """Revoke a refresh token and every token rotated from the same login."""
+    db_token = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == _hash_refresh_token(token))
+        .first()
+    )
+    if db_token is None:
+        return False
+    revoke_refresh_token_family(db, db_token.family_id)
+    return True
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
 ) -> User:
@@ -113,7 +289,7 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = db.scalars(USER_BY_USERNAME, {"username": token_data.username}).first()
     if user is None:
         raise credentials_exception
     return user
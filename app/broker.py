@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, List, Optional, Set
+
+from sqlalchemy import select, text
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.models import post_event_ids
+from app.tasks import task_queue
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "posts_published"
+# pg_advisory_xact_lock key serializing publishers
+_NOTIFY_LOCK = 0x706F737473
+
+
+@dataclass
+class BrokerEvent:
+    id: int
+    event: str
+    data: dict
+
+
+class Subscription:
+    """One consumer's bounded queue of events.
+
+    A consumer that falls `maxsize` events behind is cut off: its queue is
+    replaced by a single None, and it is expected to reconnect and resume
+    from the replay buffer with Last-Event-ID.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def offer(self, event: BrokerEvent) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[BrokerEvent]:
+        return await self.queue.get()
+
+
+class Broker:
+    """In-process pub/sub with a replay buffer for resuming streams.
+
+    Streams rely on event ids increasing in delivery order. On PostgreSQL,
+    where workers share events through LISTEN/NOTIFY, ids come from one
+    database sequence (see `publish_post`); otherwise from `next_id`.
+    """
+
+    def __init__(self, replay_size: int = 1000, subscriber_queue_size: int = 100):
+        self.subscriber_queue_size = subscriber_queue_size
+        self.buffer: Deque[BrokerEvent] = deque(maxlen=replay_size)
+        self.subscribers: Set[Subscription] = set()
+        # Newest event id that fell off the replay buffer
+        self.evicted_id = 0
+        self._last_id = 0
+
+    def next_id(self) -> int:
+        """A time-based id that is strictly increasing within this process."""
+        self._last_id = max(time.time_ns() // 1000, self._last_id + 1)
+        return self._last_id
+
+    def deliver(self, event: BrokerEvent) -> None:
+        """Record an event and fan it out; must run on the event loop."""
+        if len(self.buffer) == self.buffer.maxlen:
+            self.evicted_id = self.buffer[0].id
+        self.buffer.append(event)
+        for subscription in self.subscribers:
+            subscription.offer(event)
+
+    def replay(self, last_event_id: int) -> Optional[List[BrokerEvent]]:
+        """Buffered events after `last_event_id`, or None if some were lost."""
+        if last_event_id < self.evicted_id:
+            return None
+        return [event for event in self.buffer if event.id > last_event_id]
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[Subscription]:
+        subscription = Subscription(self.subscriber_queue_size)
+        self.subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self.subscribers.discard(subscription)
+
+
+broker = Broker(
+    replay_size=settings.sse_replay_buffer,
+    subscriber_queue_size=settings.sse_subscriber_queue_size,
+)
+
+
+def format_sse(event: BrokerEvent) -> str:
+    return f"id: {event.id}\nevent: {event.event}\ndata: {json.dumps(event.data)}\n\n"
+
+
+async def event_stream(
+    last_event_id: Optional[int] = None, broker: Broker = broker
+) -> AsyncIterator[str]:
+    """Server-sent events: replay after `last_event_id`, then live events.
+
+    Emits a `reset` event when the replay buffer no longer reaches back to
+    `last_event_id`, telling the client to refetch the feed. Ends the stream
+    when the client has fallen too far behind; EventSource reconnects on its
+    own with Last-Event-ID.
+    """
+    # Subscribe before replaying so nothing published in between is missed
+    async with broker.subscribe() as subscription:
+        yield f"retry: {settings.sse_retry_ms}\n\n"
+        sent = 0
+        if last_event_id is not None:
+            backlog = broker.replay(last_event_id)
+            if backlog is None:
+                yield "event: reset\ndata: {}\n\n"
+                backlog = list(broker.buffer)
+            for event in backlog:
+                yield format_sse(event)
+                sent = event.id
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), settings.sse_keepalive_seconds
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            if event.id > sent:
+                yield format_sse(event)
+
+
+def _use_postgres_notify() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _notify(event: str, data: dict) -> None:
+    """Number an event from the shared sequence and NOTIFY every worker.
+
+    The lock is held until commit, and notifications are delivered in commit
+    order, so every listener receives the ids in increasing order.
+    """
+    with SessionLocal() as db:
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _NOTIFY_LOCK})
+        event_id = db.scalar(select(post_event_ids.next_value()))
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {
+                "channel": NOTIFY_CHANNEL,
+                "payload": json.dumps({"id": event_id, "event": event, "data": data}),
+            },
+        )
+        db.commit()
+
+
+@task_queue.register("post.published")
+async def publish_post(payload: dict) -> None:
+    """Fan a newly published post out to every worker's stream subscribers."""
+    if _use_postgres_notify():
+        await asyncio.to_thread(_notify, "post.published", payload)
+    else:
+        broker.deliver(BrokerEvent(broker.next_id(), "post.published", payload))
+
+
+async def listen_postgres() -> None:
+    """Relay NOTIFY messages from every worker into this worker's broker."""
+    import psycopg2
+    import psycopg2.extensions
+
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    loop = asyncio.get_running_loop()
+    while True:
+        conn = None
+        try:
+            conn = await asyncio.to_thread(psycopg2.connect, dsn)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            readable = asyncio.Event()
+            loop.add_reader(conn.fileno(), readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    conn.poll()
+                    while conn.notifies:
+                        message = json.loads(conn.notifies.pop(0).payload)
+                        broker.deliver(
+                            BrokerEvent(
+                                message["id"], message["event"], message["data"]
+                            )
+                        )
+            finally:
+                loop.remove_reader(conn.fileno())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Lost the post notification listener; reconnecting")
+            await asyncio.sleep(1)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+@asynccontextmanager
+async def broker_lifespan() -> AsyncIterator[None]:
+    """Run the cross-worker listener for the lifetime of the app."""
+    if not _use_postgres_notify():
+        yield
+        return
+    listener = asyncio.create_task(listen_postgres())
+    try:
+        yield
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
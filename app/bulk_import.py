@@ -0,0 +1,215 @@
+"""Bulk loading of users and posts from CSV or NDJSON files.
+
+Rows are streamed in batches and written with PostgreSQL ``COPY``, or with a
+batched executemany ``INSERT`` on other databases. Used by
+``python -m app.cli import``.
+"""
+
+import csv
+import io
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from sqlalchemy import Table, func, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.types import TypeDecorator
+
+from app.auth import get_password_hash, pwd_context
+from app.crud import add_to_feed, reconcile_user_counters
+from app.models import Post, User, make_excerpt
+
+_TRUE = {"1", "true", "t", "yes", "y"}
+
+
+class ImportRowError(ValueError):
+    """A row of the input file cannot be imported."""
+
+
+@contextmanager
+def open_input(path: str) -> Iterator[TextIO]:
+    """Open `path` for reading, or stdin for "-"."""
+    if path == "-":
+        yield sys.stdin
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield f
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[dict]:
+    """Stream rows from a CSV file with a header, or from NDJSON."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batches(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def use_bcrypt_rounds(rounds: int) -> None:
+    """Hash new passwords in this process at the given bcrypt cost."""
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+
+def create_hasher(workers: int, rounds: int) -> ProcessPoolExecutor:
+    """A process pool hashing passwords at the given bcrypt cost."""
+    return ProcessPoolExecutor(
+        workers, initializer=use_bcrypt_rounds, initargs=(rounds,)
+    )
+
+
+def _copy(db: Session, table: Table, columns: List[str], rows: List[dict]) -> None:
+    """Load rows with COPY ... FROM STDIN, already converted for the database."""
+    dialect = db.get_bind().dialect
+    # Apply column types such as CompressedText, as an INSERT would
+    decorated = {
+        name for name in columns if isinstance(table.c[name].type, TypeDecorator)
+    }
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        values = []
+        for name in columns:
+            value = row[name]
+            if name in decorated:
+                value = table.c[name].type.process_bind_param(value, dialect)
+            if isinstance(value, bytes):
+                value = "\\x" + value.hex()
+            values.append(value)
+        writer.writerow(values)
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _write(db: Session, table: Table, columns: List[str], rows: List[dict]) -> None:
+    if db.get_bind().dialect.name == "postgresql":
+        _copy(db, table, columns, rows)
+    else:
+        db.execute(
+            insert(table), [{name: row[name] for name in columns} for row in rows]
+        )
+    db.commit()
+
+
+def _user_rows(
+    batch: List[dict], hasher: Optional[ProcessPoolExecutor], start: int
+) -> List[dict]:
+    rows = []
+    passwords = []
+    for number, row in enumerate(batch, start=start):
+        if not row.get("email") or not row.get("username"):
+            raise ImportRowError(f"user row {number} needs an email and a username")
+        hashed = row.get("hashed_password")
+        if not hashed:
+            if not row.get("password"):
+                raise ImportRowError(
+                    f"user row {number} needs a password or hashed_password"
+                )
+            passwords.append((len(rows), row["password"]))
+        rows.append(
+            {
+                "email": row["email"],
+                "username": row["username"],
+                "hashed_password": hashed,
+                "is_active": str(row.get("is_active", "true")).lower() in _TRUE,
+            }
+        )
+    if passwords:
+        plain = [password for _, password in passwords]
+        if hasher is None:
+            hashes = map(get_password_hash, plain)
+        else:
+            hashes = hasher.map(
+                get_password_hash, plain, chunksize=max(1, len(plain) // 64)
+            )
+        for (index, _), hashed in zip(passwords, hashes):
+            rows[index]["hashed_password"] = hashed
+    return rows
+
+
+def import_users(
+    db: Session,
+    rows: Iterable[dict],
+    batch_size: int = 5000,
+    hasher: Optional[ProcessPoolExecutor] = None,
+) -> int:
+    """Import users; rows carry `hashed_password` or a `password` to hash."""
+    columns = ["email", "username", "hashed_password", "is_active"]
+    count = 0
+    for batch in batches(rows, batch_size):
+        _write(db, User.__table__, columns, _user_rows(batch, hasher, count))
+        count += len(batch)
+    return count
+
+
+def _author_ids(db: Session, batch: List[dict]) -> Dict[str, int]:
+    usernames = {row["author_username"] for row in batch if row.get("author_username")}
+    if not usernames:
+        return {}
+    rows = db.execute(
+        select(User.username, User.id).where(User.username.in_(usernames))
+    )
+    return dict(rows.tuples().all())
+
+
+def _post_rows(batch: List[dict], authors: Dict[str, int], start: int) -> List[dict]:
+    rows = []
+    for number, row in enumerate(batch, start=start):
+        author_id = row.get("author_id") or authors.get(row.get("author_username"))
+        if not author_id:
+            raise ImportRowError(f"post row {number} has no known author")
+        rows.append(
+            {
+                "title": row["title"],
+                "content": row["content"],
+                "excerpt": make_excerpt(row["content"]),
+                "published": str(row.get("published", "false")).lower() in _TRUE,
+                "author_id": int(author_id),
+            }
+        )
+    return rows
+
+
+def import_posts(db: Session, rows: Iterable[dict], batch_size: int = 5000) -> int:
+    """Import posts, then update their authors' counters and the feed.
+
+    Rows name their author by `author_id` or `author_username`. A bad row
+    stops the import, keeping the batches before it. Only the imported
+    posts are added to the published feed; posts get IDs above every
+    existing one, so those are the posts past the highest ID seen before
+    the import that are not in the feed yet.
+    """
+    columns = ["title", "content", "excerpt", "published", "author_id"]
+    last_id = db.scalar(select(func.max(Post.id))) or 0
+    author_ids = set()
+    count = 0
+    try:
+        for batch in batches(rows, batch_size):
+            posts = _post_rows(batch, _author_ids(db, batch), count)
+            _write(db, Post.__table__, columns, posts)
+            author_ids.update(post["author_id"] for post in posts)
+            count += len(batch)
+    finally:
+        # Batches are committed as they go; even when a later row fails, the
+        # counters and the feed must account for the posts already loaded
+        db.rollback()
+        if author_ids:
+            reconcile_user_counters(db, author_ids)
+            add_to_feed(db, last_id)
+    return count
@@ -0,0 +1,170 @@
+"""Maintenance commands: ``python -m app.cli <command>``."""
+
+import argparse
+import os
+import time
+from datetime import date
+from typing import List, Optional
+
+from app import bulk_import, partitions
+from app.auth import configure_password_hashing, purge_refresh_tokens
+from app.config import settings
+from app.crud import rebuild_feed, reconcile_user_counters
+from app.database import SessionLocal
+
+
+def reconcile_counters(args: argparse.Namespace) -> None:
+    """Rebuild the denormalized per-user post counters."""
+    with SessionLocal() as db:
+        count = reconcile_user_counters(db)
+    print(f"Reconciled post counters for {count} users")
+
+
+def rebuild_published_feed(args: argparse.Namespace) -> None:
+    """Repopulate the published feed table from the posts table."""
+    with SessionLocal() as db:
+        count = rebuild_feed(db)
+    print(f"Rebuilt the published feed with {count} posts")
+
+
+def purge_expired_refresh_tokens(args: argparse.Namespace) -> None:
+    """Delete refresh tokens from logins whose tokens have all expired."""
+    with SessionLocal() as db:
+        count = purge_refresh_tokens(db)
+    print(f"Deleted {count} expired refresh tokens")
+
+
+def import_rows(args: argparse.Namespace) -> None:
+    """Bulk-load users or posts from a CSV or NDJSON file."""
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    hasher = None
+    if args.kind == "users":
+        rounds = args.bcrypt_rounds or configure_password_hashing()
+        bulk_import.use_bcrypt_rounds(rounds)
+        if args.hash_workers:
+            hasher = bulk_import.create_hasher(args.hash_workers, rounds)
+    start = time.perf_counter()
+    try:
+        with bulk_import.open_input(args.path) as stream, SessionLocal() as db:
+            rows = bulk_import.read_rows(stream, fmt)
+            if args.kind == "users":
+                count = bulk_import.import_users(db, rows, args.batch_size, hasher)
+            else:
+                count = bulk_import.import_posts(db, rows, args.batch_size)
+    finally:
+        if hasher is not None:
+            hasher.shutdown()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Imported {count} {args.kind} in {elapsed:.1f}s "
+        f"({count / max(elapsed, 1e-9):.0f} rows/s)"
+    )
+
+
+def partition_posts(args: argparse.Namespace) -> None:
+    """Convert the posts table into monthly partitions (PostgreSQL only)."""
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name != "postgresql":
+            print("Partitioning requires PostgreSQL")
+            return
+        if partitions.is_partitioned(db):
+            print("The posts table is already partitioned")
+            return
+        created = partitions.partition_posts(db, date.today(), args.months_ahead)
+    print(f"Partitioned posts into {len(created)} monthly partitions and a default")
+
+
+def unpartition_posts(args: argparse.Namespace) -> None:
+    """Convert a partitioned posts table back into a plain one."""
+    with SessionLocal() as db:
+        if not partitions.is_partitioned(db):
+            print("The posts table is not partitioned")
+            return
+        partitions.unpartition_posts(db)
+    print("Converted posts back into a plain table")
+
+
+def maintain_partitions(args: argparse.Namespace) -> None:
+    """Create upcoming monthly posts partitions and archive expired ones."""
+    with SessionLocal() as db:
+        if not partitions.is_partitioned(db):
+            print("The posts table is not partitioned (requires PostgreSQL)")
+            return
+        today = date.today()
+        created = partitions.create_partitions(db, today, args.months_ahead)
+        archived = []
+        if args.retention_months is not None:
+            archived = partitions.archive_partitions(
+                db, today, args.retention_months, args.archive_schema, args.drop
+            )
+    print(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+    action = "Dropped" if args.drop else f"Archived to {args.archive_schema}"
+    print(f"{action} {len(archived)} partitions: {', '.join(archived) or '-'}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = commands.add_parser(
+        "reconcile-counters", help=reconcile_counters.__doc__
+    )
+    reconcile.set_defaults(func=reconcile_counters)
+
+    feed = commands.add_parser("rebuild-feed", help=rebuild_published_feed.__doc__)
+    feed.set_defaults(func=rebuild_published_feed)
+
+    purge = commands.add_parser(
+        "purge-refresh-tokens", help=purge_expired_refresh_tokens.__doc__
+    )
+    purge.set_defaults(func=purge_expired_refresh_tokens)
+
+    importer = commands.add_parser("import", help=import_rows.__doc__)
+    importer.add_argument("kind", choices=["users", "posts"])
+    importer.add_argument("path", help="CSV or NDJSON file, or - for stdin")
+    importer.add_argument("--format", choices=["csv", "ndjson"])
+    importer.add_argument("--batch-size", type=int, default=5000)
+    importer.add_argument(
+        "--hash-workers",
+        type=int,
+        default=os.cpu_count(),
+        help="processes hashing plain `password` values (0 hashes inline)",
+    )
+    importer.add_argument(
+        "--bcrypt-rounds",
+        type=int,
+        help="bcrypt cost for hashed passwords (default: the app's setting)",
+    )
+    importer.set_defaults(func=import_rows)
+
+    converter = commands.add_parser("partition-posts", help=partition_posts.__doc__)
+    converter.add_argument(
+        "--months-ahead", type=int, default=settings.posts_partition_months_ahead
+    )
+    converter.set_defaults(func=partition_posts)
+
+    reverter = commands.add_parser("unpartition-posts", help=unpartition_posts.__doc__)
+    reverter.set_defaults(func=unpartition_posts)
+
+    partitioner = commands.add_parser("partitions", help=maintain_partitions.__doc__)
+    partitioner.add_argument(
+        "--months-ahead", type=int, default=settings.posts_partition_months_ahead
+    )
+    partitioner.add_argument(
+        "--retention-months",
+        type=int,
+        default=settings.posts_partition_retention_months,
+        help="archive partitions older than this many full months",
+    )
+    partitioner.add_argument("--archive-schema", default=settings.posts_archive_schema)
+    partitioner.add_argument(
+        "--drop", action="store_true", help="drop expired partitions, not archive"
+    )
+    partitioner.set_defaults(func=maintain_partitions)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
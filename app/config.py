@@ -11,11 +11,104 @@ class Settings(BaseSettings):
     secret_key: str = "your-secret-key-here-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 30
+
+    # Password hashing: a fixed bcrypt cost, or None to calibrate at startup so
+    # one hash takes roughly bcrypt_target_ms on this hardware
+    bcrypt_rounds: Optional[int] = None
+    bcrypt_target_ms: float = 250
+    bcrypt_min_rounds: int = 10
+    bcrypt_max_rounds: int = 16
 
     # Application
     debug: bool = True
     api_v1_str: str = "/api/v1"
     project_name: str = "Blog API"
+    batch_max_ids: int = 100  # ids accepted by the /batch endpoints
+
+    # Idempotency-Key support (POST /posts/, /auth/signup)
+    idempotency_enabled: bool = True
+    idempotency_cache_size: int = 10000  # responses kept in memory per worker
+    idempotency_ttl_seconds: int = 86400
+    idempotency_sql_store: bool = False  # share responses via idempotency_keys
+
+    # Adaptive concurrency limit and load shedding (per worker)
+    load_shed_enabled: bool = True
+    load_shed_initial_limit: int = 100
+    load_shed_min_limit: int = 10
+    load_shed_max_limit: int = 1000
+    load_shed_target_latency_ms: float = 500  # slower requests shrink the limit
+    load_shed_backoff: float = 0.9  # multiplicative decrease
+    load_shed_read_share: float = 0.9  # of the limit, for authenticated reads
+    load_shed_anonymous_read_share: float = 0.75
+
+    # Per-request profiling; the middleware is only installed when enabled
+    profiler_enabled: bool = False
+    profiler_token: Optional[str] = None  # X-Profile header value (admin only)
+    profiler_sample_rate: float = 0.0  # fraction of requests profiled to disk
+    profiler_interval_ms: float = 5
+    profiler_output_dir: str = "profiles"
+
+    # Identical concurrent GET /posts/ and /posts/{id} share one query
+    read_coalescing_enabled: bool = True
+    read_coalescing_window_ms: float = 50  # results reused this long afterwards
+
+    # Post view counters, buffered per worker and written in batches
+    view_counts_enabled: bool = True
+    view_count_flush_interval: float = 5.0  # seconds; bounds loss on a crash
+    view_count_max_pending: int = 10000  # distinct posts before an early flush
+
+    # Post bodies
+    post_excerpt_length: int = 200  # characters kept in posts.excerpt
+    post_content_compression: bool = False  # zlib-compress large bodies
+    post_content_compression_threshold: int = 2048  # bytes
+
+    # Monthly range partitions of posts (PostgreSQL; see `app.cli partition-posts`)
+    posts_partition_months_ahead: int = 3  # future months kept created
+    posts_partition_retention_months: Optional[int] = None  # None keeps everything
+    posts_archive_schema: str = "archive"  # where detached partitions are moved
+
+    # Background tasks
+    task_workers: int = 2
+    task_queue_size: int = 10000
+    task_max_retries: int = 5
+    task_retry_backoff: float = 0.5  # seconds, doubled on every retry
+    task_outbox_enabled: bool = False  # also persist events to outbox_events
+    task_outbox_poll_interval: float = 5.0
+    task_outbox_claim_timeout: float = 300  # seconds before a claim is replayed
+    task_outbox_retention_days: float = 7  # processed rows are deleted after this
+
+    # Server-sent events (GET /posts/stream)
+    sse_replay_buffer: int = 1000  # events kept for Last-Event-ID resumption
+    sse_subscriber_queue_size: int = 100  # slower consumers are disconnected
+    sse_keepalive_seconds: float = 15
+    sse_retry_ms: int = 3000
+
+    # Production server (python -m app.serve)
+    server_host: str = "0.0.0.0"
+    port: int = 8000
+    web_concurrency: Optional[int] = None  # default: one worker per available CPU
+    server_loop: str = "uvloop"
+    server_http: str = "httptools"
+    server_max_requests: int = 10000  # recycle workers to bound memory growth
+    server_max_requests_jitter: int = 1000
+    server_keepalive: int = 5
+    server_graceful_timeout: int = 30
+    server_timeout: int = 60
+    server_backlog: int = 2048
+    server_access_log: bool = False
+
+    # Rate limiting (token buckets: burst size and refill rate per minute)
+    rate_limit_enabled: bool = True
+    rate_limit_storage_url: Optional[str] = None  # memory:// (default) or redis://
+    rate_limit_trust_proxy: bool = False
+    rate_limit_trusted_proxies: int = 1  # proxies appending to X-Forwarded-For
+    login_rate_limit_ip_burst: int = 20
+    login_rate_limit_ip_per_minute: float = 10
+    login_rate_limit_user_burst: int = 10
+    login_rate_limit_user_per_minute: float = 5
+    signup_rate_limit_ip_burst: int = 5
+    signup_rate_limit_ip_per_minute: float = 2
 
     class Config:
         env_file = ".env"
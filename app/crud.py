@@ -1,8 +1,92 @@
-from sqlalchemy.orm import Session
-
-from app.auth import get_password_hash
-from app.models import Post, User
+from types import SimpleNamespace
+from typing import Collection, Dict, List, Optional
+
+from sqlalchemy import (
+    Integer,
+    bindparam,
+    column,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, undefer
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.auth import (
+    USER_BY_USERNAME,
+    get_password_hash,
+    revoke_user_refresh_tokens,
+)
+from app.models import FeedEntry, Post, PostTag, User, make_excerpt
 from app.schemas import PostCreate, PostUpdate, UserCreate, UserUpdate
+from app.tasks import emit
+
+
+class VersionConflictError(Exception):
+    """The row changed since the version the caller based its write on."""
+
+
+class DuplicateValueError(Exception):
+    """A write collided with a unique constraint on `field`."""
+
+    def __init__(self, field: str):
+        super().__init__(field)
+        self.field = field
+
+
+def _duplicate_field(exc: IntegrityError) -> Optional[str]:
+    """Name the users column behind a unique violation, if recognisable."""
+    # PostgreSQL: 'Key (email)=(...) already exists'; SQLite: 'users.email'
+    message = str(exc.orig)
+    for field in ("email", "username"):
+        if f"({field})" in message or f"users.{field}" in message:
+            return field
+    return None
+
+
+# Columns read back by PATCH; everything the response schemas need
+_USER_COLUMNS = (
+    User.id,
+    User.email,
+    User.username,
+    User.is_active,
+    User.created_at,
+    User.updated_at,
+    User.post_count,
+    User.published_count,
+    User.last_post_at,
+)
+_POST_SUMMARY_COLUMNS = (
+    Post.id,
+    Post.title,
+    Post.excerpt,
+    Post.published,
+    Post.version,
+    Post.created_at,
+    Post.updated_at,
+    Post.author_id,
+)
+
+# Hot read statements, built once with bound parameters instead of per call;
+# SQLAlchemy then reuses their compiled SQL from the statement cache
+_USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+_POST_BY_ID = (
+    select(Post)
+    .options(undefer(Post.content), joinedload(Post.tag_links))
+    .where(Post.id == bindparam("post_id"))
+)
+_POSTS_PAGE = select(Post).offset(bindparam("skip")).limit(bindparam("limit"))
+_PUBLISHED_POSTS_PAGE = _POSTS_PAGE.where(Post.published == True)
+_USER_POSTS_PAGE = _POSTS_PAGE.where(Post.author_id == bindparam("user_id"))
+_WITH_CONTENT = undefer(Post.content)
+_FULL_POSTS_PAGE = _POSTS_PAGE.options(_WITH_CONTENT)
+_FULL_PUBLISHED_POSTS_PAGE = _PUBLISHED_POSTS_PAGE.options(_WITH_CONTENT)
+_FULL_USER_POSTS_PAGE = _USER_POSTS_PAGE.options(_WITH_CONTENT)
 
 
 # User CRUD operations
@@ -13,12 +97,18 @@ def get_user(db: Session, user_id: int) -> User:
 
 def get_user_by_email(db: Session, email: str) -> User:
     """Get user by email."""
-    return db.query(User).filter(User.email == email).first()
+    return db.scalars(_USER_BY_EMAIL, {"email": email}).first()
 
 
 def get_user_by_username(db: Session, username: str) -> User:
     """Get user by username."""
-    return db.query(User).filter(User.username == username).first()
+    return db.scalars(USER_BY_USERNAME, {"username": username}).first()
+
+
+def get_users_by_ids(db: Session, ids: List[int]) -> Dict[int, User]:
+    """Get users by ID with a single IN query, keyed by ID."""
+    users = db.query(User).filter(User.id.in_(ids)).all()
+    return {user.id: user for user in users}
 
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
@@ -26,16 +116,32 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(User).offset(skip).limit(limit).all()
 
 
-def create_user(db: Session, user: UserCreate) -> User:
-    """Create a new user."""
+def create_user(db: Session, user: UserCreate) -> Row:
+    """Create a new user with a single INSERT ... RETURNING.
+
+    Relies on the unique constraints instead of looking the email and
+    username up first. Raises DuplicateValueError when either is taken.
+    """
     hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email, username=user.username, hashed_password=hashed_password
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    try:
+        row = db.execute(
+            insert(User)
+            .values(
+                email=user.email,
+                username=user.username,
+                hashed_password=hashed_password,
+                is_active=True,
+            )
+            .returning(*_USER_COLUMNS)
+        ).one()
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        field = _duplicate_field(exc)
+        if field is None:
+            raise
+        raise DuplicateValueError(field) from exc
+    return row
 
 
 def update_user(db: Session, user_id: int, user_update: UserUpdate) -> User:
@@ -47,79 +153,498 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> User:
     update_data = user_update.dict(exclude_unset=True)
     if "password" in update_data:
         update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+        # A password change logs out every other session
+        revoke_user_refresh_tokens(db, user_id, commit=False)
 
     for field, value in update_data.items():
         setattr(db_user, field, value)
 
+    if "username" in update_data:
+        _rename_feed_author(db, user_id, db_user.username)
     db.commit()
     db.refresh(db_user)
     return db_user
 
 
+def patch_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[Row]:
+    """Partially update a user with a single UPDATE ... RETURNING.
+
+    Only supplied fields are written. Raises DuplicateValueError when the new
+    email or username is taken.
+    """
+    values = {
+        field: value
+        for field, value in user_update.dict(exclude_unset=True).items()
+        if value is not None
+    }
+    if "password" in values:
+        values["hashed_password"] = get_password_hash(values.pop("password"))
+    if not values:
+        return db.execute(select(*_USER_COLUMNS).where(User.id == user_id)).first()
+
+    try:
+        row = db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(**values)
+            .returning(*_USER_COLUMNS)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is not None and "username" in values:
+            _rename_feed_author(db, user_id, row.username)
+        if row is not None and "hashed_password" in values:
+            revoke_user_refresh_tokens(db, user_id, commit=False)
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        field = _duplicate_field(exc)
+        if field is None:
+            raise
+        raise DuplicateValueError(field) from exc
+    return row
+
+
 def delete_user(db: Session, user_id: int) -> bool:
-    """Delete a user."""
-    db_user = get_user(db, user_id)
-    if not db_user:
-        return False
+    """Delete a user; the database cascades to their posts and tokens."""
+    result = db.execute(
+        delete(User)
+        .where(User.id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def _adjust_post_counters(
+    db: Session, user_id: int, posts: int = 0, published: int = 0, **values
+) -> None:
+    """Apply counter deltas to a user in the current transaction."""
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            post_count=User.post_count + posts,
+            published_count=User.published_count + published,
+            # Counters are not profile edits; keep the onupdate from firing
+            updated_at=User.updated_at,
+            **values,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_user_counters(
+    db: Session, user_ids: Optional[Collection[int]] = None, commit: bool = True
+) -> int:
+    """Recompute post counters from the posts table, for everyone by default."""
+    posts = select(func.count(Post.id)).where(Post.author_id == User.id)
+    statement = update(User)
+    if user_ids is not None:
+        statement = statement.where(User.id.in_(user_ids))
+    result = db.execute(
+        statement.values(
+            post_count=posts.scalar_subquery(),
+            published_count=posts.where(Post.published == True).scalar_subquery(),
+            last_post_at=select(func.max(Post.created_at))
+            .where(Post.author_id == User.id)
+            .scalar_subquery(),
+            updated_at=User.updated_at,
+        ).execution_options(synchronize_session=False)
+    )
+    if commit:
+        db.commit()
+    return result.rowcount
+
+
+def _rename_feed_author(db: Session, user_id: int, username: str) -> None:
+    db.execute(
+        update(FeedEntry)
+        .where(FeedEntry.author_id == user_id)
+        .values(author_username=username)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _set_published(
+    db: Session, post, published: bool, adjust_counters: bool = True
+) -> None:
+    """Side effects of a post flipping between draft and published.
+
+    Adjusts the author's counter and the feed table in the current
+    transaction, and announces new publications (see app.broker).
+    """
+    if adjust_counters:
+        _adjust_post_counters(db, post.author_id, published=1 if published else -1)
+    if not published:
+        db.execute(delete(FeedEntry).where(FeedEntry.post_id == post.id))
+        return
+
+    db.execute(
+        insert(FeedEntry).values(
+            post_id=post.id,
+            title=post.title,
+            author_id=post.author_id,
+            author_username=select(User.username)
+            .where(User.id == post.author_id)
+            .scalar_subquery(),
+            created_at=select(Post.created_at)
+            .where(Post.id == post.id)
+            .scalar_subquery(),
+        )
+    )
+    emit(
+        db,
+        "post.published",
+        {"post_id": post.id, "author_id": post.author_id, "title": post.title},
+    )
+
+
+def _retitle_feed_entry(db: Session, post_id: int, title: str) -> None:
+    db.execute(
+        update(FeedEntry)
+        .where(FeedEntry.post_id == post_id)
+        .values(title=title)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_feed(db: Session, limit: int = 20, before: Optional[int] = None):
+    """Newest published posts from the feed table, keyset-paginated."""
+    query = db.query(FeedEntry)
+    if before is not None:
+        query = query.filter(FeedEntry.id < before)
+    return query.order_by(FeedEntry.id.desc()).limit(limit).all()
+
+
+def _insert_feed_rows(*conditions):
+    """INSERT ... SELECT of feed rows for the published posts matching."""
+    return insert(FeedEntry).from_select(
+        [
+            "post_id",
+            "title",
+            "author_id",
+            "author_username",
+            "created_at",
+            "published_at",
+        ],
+        select(
+            Post.id,
+            Post.title,
+            Post.author_id,
+            User.username,
+            Post.created_at,
+            Post.created_at,
+        )
+        .join(User, User.id == Post.author_id)
+        .where(Post.published == True, *conditions)
+        .order_by(Post.created_at, Post.id),
+    )
+
 
-    db.delete(db_user)
+def rebuild_feed(db: Session) -> int:
+    """Repopulate the feed table from the published posts."""
+    db.execute(delete(FeedEntry))
+    result = db.execute(_insert_feed_rows())
     db.commit()
-    return True
+    return result.rowcount
+
+
+def add_to_feed(db: Session, after_id: int) -> int:
+    """Add the published posts above `after_id` that are not in the feed yet."""
+    in_feed = select(FeedEntry.post_id).where(FeedEntry.post_id == Post.id).exists()
+    result = db.execute(_insert_feed_rows(Post.id > after_id, ~in_feed))
+    db.commit()
+    return result.rowcount
 
 
 # Post CRUD operations
+def _post_event(post: Post, **extra) -> dict:
+    """Payload for post events handled by background tasks."""
+    return {
+        "post_id": post.id,
+        "author_id": post.author_id,
+        "published": bool(post.published),
+        **extra,
+    }
+
+
 def get_post(db: Session, post_id: int) -> Post:
-    """Get post by ID."""
-    return db.query(Post).filter(Post.id == post_id).first()
+    """Get post by ID, including its content and tags."""
+    return db.scalars(_POST_BY_ID, {"post_id": post_id}).unique().first()
+
+
+def get_posts_by_ids(db: Session, ids: List[int]) -> Dict[int, Post]:
+    """Get posts and their authors by ID with a single IN query, keyed by ID."""
+    posts = (
+        db.query(Post)
+        .options(
+            joinedload(Post.author),
+            joinedload(Post.tag_links),
+            undefer(Post.content),
+        )
+        .filter(Post.id.in_(ids))
+        .all()
+    )
+    return {post.id: post for post in posts}
 
 
 def get_posts(
-    db: Session, skip: int = 0, limit: int = 100, published_only: bool = False
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    published_only: bool = False,
+    with_content: bool = False,
+):
+    """Get all posts with pagination; content is only loaded on request."""
+    if published_only:
+        statement = (
+            _FULL_PUBLISHED_POSTS_PAGE if with_content else _PUBLISHED_POSTS_PAGE
+        )
+    else:
+        statement = _FULL_POSTS_PAGE if with_content else _POSTS_PAGE
+    return db.scalars(statement, {"skip": skip, "limit": limit}).all()
+
+
+def get_user_posts(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    with_content: bool = False,
+):
+    """Get posts by user ID; content is only loaded on request."""
+    return db.scalars(
+        _FULL_USER_POSTS_PAGE if with_content else _USER_POSTS_PAGE,
+        {"user_id": user_id, "skip": skip, "limit": limit},
+    ).all()
+
+
+def get_posts_by_tag(
+    db: Session,
+    tag: str,
+    limit: int = 100,
+    before: Optional[int] = None,
+    published_only: bool = False,
+    with_content: bool = False,
 ):
-    """Get all posts with pagination."""
-    query = db.query(Post)
+    """Posts with a tag, newest first, keyset-paginated by post ID."""
+    statement = (
+        select(Post)
+        .join(PostTag, PostTag.post_id == Post.id)
+        .where(PostTag.tag == tag)
+        .order_by(PostTag.post_id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        statement = statement.where(PostTag.post_id < before)
     if published_only:
-        query = query.filter(Post.published == True)
-    return query.offset(skip).limit(limit).all()
+        statement = statement.where(Post.published == True)
+    if with_content:
+        statement = statement.options(_WITH_CONTENT)
+    return db.scalars(statement).all()
 
 
-def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    """Get posts by user ID."""
-    return (
-        db.query(Post).filter(Post.author_id == user_id).offset(skip).limit(limit).all()
-    )
+def _replace_tags(db: Session, post_id: int, tags: List[str]) -> None:
+    db.execute(delete(PostTag).where(PostTag.post_id == post_id))
+    if tags:
+        db.execute(insert(PostTag), [{"post_id": post_id, "tag": tag} for tag in tags])
 
 
 def create_post(db: Session, post: PostCreate, user_id: int) -> Post:
     """Create a new post."""
     db_post = Post(**post.dict(), author_id=user_id)
     db.add(db_post)
+    db.flush()
+    _adjust_post_counters(
+        db, user_id, posts=1, published=int(post.published), last_post_at=func.now()
+    )
+    if db_post.published:
+        _set_published(db, db_post, True, adjust_counters=False)
+    emit(db, "post.created", _post_event(db_post))
     db.commit()
     db.refresh(db_post)
     return db_post
 
 
-def update_post(db: Session, post_id: int, post_update: PostUpdate) -> Post:
-    """Update post information."""
+def update_post(
+    db: Session,
+    post_id: int,
+    post_update: PostUpdate,
+    if_match: Optional[Collection[int]] = None,
+) -> Post:
+    """Update post information.
+
+    With `if_match`, the update only applies if the post's version is one of
+    the given versions; otherwise (or if a concurrent write wins the race)
+    VersionConflictError is raised.
+    """
     db_post = get_post(db, post_id)
     if not db_post:
         return None
-
-    update_data = post_update.dict(exclude_unset=True)
+    if if_match is not None and db_post.version not in if_match:
+        raise VersionConflictError(post_id)
+
+    was_published = bool(db_post.published)
+    # As with PATCH, an explicit null leaves the field unchanged
+    update_data = {
+        field: value
+        for field, value in post_update.dict(exclude_unset=True).items()
+        if value is not None
+    }
     for field, value in update_data.items():
         setattr(db_post, field, value)
-
-    db.commit()
+    if "tags" in update_data:
+        # Tags live in their own table; touch the row so its version moves on
+        db_post.updated_at = func.now()
+
+    if bool(db_post.published) != was_published:
+        _set_published(db, db_post, bool(db_post.published))
+    elif was_published and "title" in update_data:
+        _retitle_feed_entry(db, post_id, db_post.title)
+    emit(db, "post.updated", _post_event(db_post, changed=sorted(update_data)))
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise VersionConflictError(post_id)
     db.refresh(db_post)
     return db_post
 
 
+def patch_post(
+    db: Session,
+    post_id: int,
+    post_update: PostUpdate,
+    author_id: Optional[int] = None,
+    if_match: Optional[Collection[int]] = None,
+) -> Optional[SimpleNamespace]:
+    """Partially update a post with a single UPDATE ... RETURNING.
+
+    Only supplied fields are written and only summary columns (no content)
+    are read back, plus the post's tags. Returns None when no post matched:
+    missing, not owned by `author_id`, or its version is not in `if_match`.
+    """
+    values = {
+        field: value
+        for field, value in post_update.dict(exclude_unset=True).items()
+        if value is not None
+    }
+    conditions = [Post.id == post_id]
+    if author_id is not None:
+        conditions.append(Post.author_id == author_id)
+    if if_match is not None:
+        conditions.append(Post.version.in_(if_match))
+    changed = sorted(values)
+    tags = values.pop("tags", None)
+    if not values and tags is None:
+        row = db.execute(select(*_POST_SUMMARY_COLUMNS).where(*conditions)).first()
+        return None if row is None else _with_tags(db, row)
+    if "content" in values:
+        values["excerpt"] = make_excerpt(values["content"])
+
+    statement = (
+        update(Post)
+        .values(**values, version=Post.version + 1)
+        .returning(*_POST_SUMMARY_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    row = None
+    if "published" in values:
+        # Only matches if the flag actually flips, which tells us whether the
+        # author's published counter needs adjusting
+        row = db.execute(
+            statement.where(
+                *conditions, Post.published.is_distinct_from(values["published"])
+            )
+        ).first()
+        if row is not None:
+            _set_published(db, row, bool(row.published))
+    if row is None:
+        row = db.execute(statement.where(*conditions)).first()
+        if row is not None and row.published and "title" in values:
+            _retitle_feed_entry(db, post_id, row.title)
+    if row is None:
+        db.rollback()
+        return None
+    if tags is not None:
+        _replace_tags(db, row.id, tags)
+
+    emit(
+        db,
+        "post.updated",
+        {
+            "post_id": row.id,
+            "author_id": row.author_id,
+            "published": bool(row.published),
+            "changed": changed,
+        },
+    )
+    db.commit()
+    return _with_tags(db, row, tags)
+
+
+def _with_tags(
+    db: Session, row: Row, tags: Optional[List[str]] = None
+) -> SimpleNamespace:
+    """A summary row with the post's tags, read back unless just written."""
+    if tags is None:
+        tags = db.scalars(
+            select(PostTag.tag).where(PostTag.post_id == row.id).order_by(PostTag.tag)
+        ).all()
+    return SimpleNamespace(**row._asdict(), tags=tags)
+
+
 def delete_post(db: Session, post_id: int) -> bool:
     """Delete a post."""
     db_post = get_post(db, post_id)
     if not db_post:
         return False
 
+    emit(db, "post.deleted", _post_event(db_post))
     db.delete(db_post)
+    db.flush()
+    _adjust_post_counters(
+        db,
+        db_post.author_id,
+        posts=-1,
+        published=-int(bool(db_post.published)),
+        last_post_at=select(func.max(Post.created_at))
+        .where(Post.author_id == db_post.author_id)
+        .scalar_subquery(),
+    )
     db.commit()
     return True
+
+
+def add_post_views(db: Session, counts: Dict[int, int]) -> None:
+    """Add buffered view counts to posts in one batched statement.
+
+    Views are not edits, so neither `updated_at` nor `version` changes.
+    """
+    if not counts:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        increments = values(
+            column("id", Integer), column("n", Integer), name="increments"
+        ).data(list(counts.items()))
+        db.execute(
+            update(Post)
+            .where(Post.id == increments.c.id)
+            .values(
+                view_count=Post.view_count + increments.c.n,
+                updated_at=Post.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        # No UPDATE ... FROM (VALUES ...) elsewhere; one executemany instead
+        db.execute(
+            update(Post.__table__)
+            .where(Post.id == bindparam("post_id"))
+            .values(
+                view_count=Post.view_count + bindparam("n"),
+                updated_at=Post.updated_at,
+            ),
+            [{"post_id": post_id, "n": n} for post_id, n in counts.items()],
+        )
+    db.commit()
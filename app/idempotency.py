@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Collection, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import IdempotencyKey
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+# Responses worth replaying: the request was processed (or rejected for a
+# reason that will not change on retry)
+_NOT_STORED = {409, 429}
+
+
+@dataclass
+class StoredResponse:
+    """A completed response, replayed for later requests with the same key."""
+
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class IdempotencyStore:
+    """Storage backend for completed responses, keyed by scoped idempotency key."""
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        raise NotImplementedError
+
+    def put(self, key: str, response: StoredResponse) -> None:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Forget all stored responses."""
+        raise NotImplementedError
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Per-process LRU of recent responses."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, StoredResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, response: StoredResponse) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLIdempotencyStore(IdempotencyStore):
+    """Responses shared between workers through the `idempotency_keys` table.
+
+    Reads go through an in-memory LRU first, so replays within one worker
+    never touch the database.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        cache: InMemoryIdempotencyStore,
+        ttl: float = 86400,
+    ):
+        self.session_factory = session_factory
+        self.cache = cache
+        self.ttl = ttl
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        with self.session_factory() as db:
+            row = db.get(IdempotencyKey, key)
+            if row is None:
+                return None
+            created_at = row.created_at
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            if created_at < self._cutoff():
+                return None
+            response = StoredResponse(
+                row.fingerprint,
+                row.status_code,
+                [(name.encode(), value.encode()) for name, value in row.headers],
+                row.body,
+            )
+        self.cache.put(key, response)
+        return response
+
+    def put(self, key: str, response: StoredResponse) -> None:
+        self.cache.put(key, response)
+        values = {
+            "key": key,
+            "fingerprint": response.fingerprint,
+            "status_code": response.status,
+            "headers": [
+                [name.decode(), value.decode()] for name, value in response.headers
+            ],
+            "body": response.body,
+        }
+        with self.session_factory() as db:
+            db.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.created_at < self._cutoff())
+            )
+            dialect = db.get_bind().dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                # Concurrent requests with one key both write; the last wins
+                upsert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+                statement = upsert[dialect](IdempotencyKey).values(**values)
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[IdempotencyKey.key],
+                        set_={
+                            **{
+                                name: statement.excluded[name]
+                                for name in values
+                                if name != "key"
+                            },
+                            "created_at": func.now(),
+                        },
+                    )
+                )
+                db.commit()
+                return
+            try:
+                db.execute(insert(IdempotencyKey).values(**values))
+                db.commit()
+            except IntegrityError:
+                # Another request stored this key first; keep its response
+                db.rollback()
+
+    def reset(self) -> None:
+        self.cache.reset()
+        with self.session_factory() as db:
+            db.execute(delete(IdempotencyKey))
+            db.commit()
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def create_store() -> IdempotencyStore:
+    """Build the store described by `Settings`."""
+    cache = InMemoryIdempotencyStore(
+        settings.idempotency_cache_size, settings.idempotency_ttl_seconds
+    )
+    if not settings.idempotency_sql_store:
+        return cache
+    from app.database import SessionLocal
+
+    return SQLIdempotencyStore(SessionLocal, cache, settings.idempotency_ttl_seconds)
+
+
+def get_store() -> IdempotencyStore:
+    """Return the process-wide idempotency store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_store()
+    return _store
+
+
+def set_store(store: Optional[IdempotencyStore]) -> None:
+    """Replace the process-wide idempotency store."""
+    global _store
+    _store = store
+
+
+async def _send_json(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Replay the stored response for POSTs retried with an Idempotency-Key.
+
+    Keys are scoped to the path and the caller's Authorization header, and
+    bound to a fingerprint of the request body: reusing a key for a
+    different request is rejected with 422. A retry that arrives while the
+    original is still running waits for it in this worker. Server errors,
+    409s and 429s are not stored, so those requests can be retried.
+    """
+
+    def __init__(self, app, paths: Collection[str]):
+        self.app = app
+        self.paths = set(paths)
+        self._inflight: Dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+            or not settings.idempotency_enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, "Invalid Idempotency-Key header")
+            return
+
+        body = await _read_body(receive)
+        caller = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()
+        key = hashlib.sha256(
+            b"\0".join([scope["path"].encode(), caller.encode(), idempotency_key])
+        ).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+        store = get_store()
+
+        while True:
+            stored = await asyncio.to_thread(store.get, key)
+            if stored is not None:
+                await _replay(send, stored, fingerprint)
+                return
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            await pending.wait()
+
+        self._inflight[key] = asyncio.Event()
+        try:
+            await self._run(scope, body, send, store, key, fingerprint)
+        finally:
+            self._inflight.pop(key).set()
+
+    async def _run(self, scope, body, send, store, key, fingerprint) -> None:
+        started = {}
+        chunks = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, capture)
+        status = started.get("status", 500)
+        if status < 500 and status not in _NOT_STORED:
+            response = StoredResponse(
+                fingerprint, status, list(started.get("headers", [])), b"".join(chunks)
+            )
+            await asyncio.to_thread(store.put, key, response)
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _replay(send, stored: StoredResponse, fingerprint: str) -> None:
+    if stored.fingerprint != fingerprint:
+        await _send_json(
+            send, 422, "Idempotency-Key was already used for a different request"
+        )
+        return
+    await send(
+        {
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": stored.headers + [(b"idempotent-replayed", b"true")],
+        }
+    )
+    await send({"type": "http.response.body", "body": stored.body})
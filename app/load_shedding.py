@@ -0,0 +1,203 @@
+import json
+import time
+from collections import deque
+from typing import Collection
+
+from jose import JWTError, jwt
+
+from app.config import settings
+
+# Request classes, in order of importance. Each may only use its share of
+# the concurrency limit, so anonymous reads are shed first, then other
+# reads, and writes and authentication last.
+CRITICAL = "critical"
+READ = "read"
+ANONYMOUS_READ = "anonymous_read"
+
+_READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class AdaptiveLimiter:
+    """Per-process concurrency limit adjusted by observed latency (AIMD).
+
+    Every request completing within `target_latency` while the limit is in
+    use grows the limit additively (by about one per limit's worth of
+    requests); a slow or failed request shrinks it multiplicatively, at most
+    once per `target_latency` so a burst of slow completions counts once.
+
+    The worker reports itself not ready while saturated, or after shedding
+    `ready_shed_count` requests within `ready_window` seconds; an occasional
+    shed request is normal and should not fail health checks.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 100,
+        min_limit: float = 10,
+        max_limit: float = 1000,
+        target_latency: float = 0.5,
+        backoff: float = 0.9,
+        read_share: float = 0.9,
+        anonymous_read_share: float = 0.75,
+        ready_shed_count: int = 10,
+        ready_window: float = 5.0,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.shares = {
+            CRITICAL: 1.0,
+            READ: read_share,
+            ANONYMOUS_READ: anonymous_read_share,
+        }
+        self.ready_window = ready_window
+        self.in_flight = 0
+        self.shed = 0
+        self._last_decrease = 0.0
+        # Times of the most recent sheds, enough to tell a sustained rate
+        self._recent_sheds = deque(maxlen=ready_shed_count)
+
+    def try_acquire(self, priority: str = CRITICAL) -> bool:
+        """Admit a request of `priority`, or record it as shed."""
+        if self.in_flight >= max(1, int(self.limit * self.shares[priority])):
+            self.shed += 1
+            self._recent_sheds.append(time.monotonic())
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        """Finish an admitted request and adjust the limit from its latency."""
+        in_use = self.in_flight
+        self.in_flight -= 1
+        now = time.monotonic()
+        if failed or latency > self.target_latency:
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif in_use >= self.limit / 2:
+            # Only grow while the limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    @property
+    def ready(self) -> bool:
+        """False while saturated or shedding at a sustained rate."""
+        if self.in_flight >= int(self.limit):
+            return False
+        return (
+            len(self._recent_sheds) < self._recent_sheds.maxlen
+            or time.monotonic() - self._recent_sheds[0] > self.ready_window
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "limit": int(self.limit),
+            "shed": self.shed,
+        }
+
+
+limiter = AdaptiveLimiter(
+    initial_limit=settings.load_shed_initial_limit,
+    min_limit=settings.load_shed_min_limit,
+    max_limit=settings.load_shed_max_limit,
+    target_latency=settings.load_shed_target_latency_ms / 1000,
+    backoff=settings.load_shed_backoff,
+    read_share=settings.load_shed_read_share,
+    anonymous_read_share=settings.load_shed_anonymous_read_share,
+)
+
+
+def _has_valid_token(scope) -> bool:
+    """Whether the request carries a bearer token we signed and is unexpired.
+
+    Only the signature is checked, not the user; that takes microseconds,
+    while a database lookup would defeat the point of shedding early.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                payload = jwt.decode(
+                    token.strip(), settings.secret_key, algorithms=[settings.algorithm]
+                )
+            except JWTError:
+                return False
+            return payload.get("sub") is not None
+    return False
+
+
+def classify(scope, auth_prefix: str) -> str:
+    """Priority of a request from its method, path and credentials."""
+    if scope["method"] not in _READ_METHODS or scope["path"].startswith(auth_prefix):
+        return CRITICAL
+    if _has_valid_token(scope):
+        return READ
+    return ANONYMOUS_READ
+
+
+class LoadSheddingMiddleware:
+    """Reject requests beyond the adaptive concurrency limit with a fast 503.
+
+    Runs before any work is done for a request, so an overloaded worker
+    spends nothing on requests it cannot serve in time. Paths in `exempt`
+    (health checks, long-lived streams) are neither limited nor measured.
+    """
+
+    def __init__(
+        self,
+        app,
+        auth_prefix: str,
+        exempt: Collection[str] = (),
+        limiter: AdaptiveLimiter = limiter,
+    ):
+        self.app = app
+        self.auth_prefix = auth_prefix
+        self.exempt = set(exempt)
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] in self.exempt
+            or not settings.load_shed_enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not self.limiter.try_acquire(classify(scope, self.auth_prefix)):
+            await _send_overloaded(send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.limiter.release(time.monotonic() - started, failed=status >= 500)
+
+
+async def _send_overloaded(send) -> None:
+    body = json.dumps({"detail": "Server is overloaded, retry shortly"}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -1,20 +1,42 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.auth import configure_password_hashing
+from app.broker import broker_lifespan
 from app.config import settings
 from app.database import engine
+from app.idempotency import IdempotencyMiddleware
+from app.load_shedding import LoadSheddingMiddleware, limiter
 from app.models import Base
+from app.profiling import ProfilingMiddleware
 from app.routers import auth, posts, users
+from app.tasks import task_queue
+from app.views import view_counter_lifespan
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown."""
+    configure_password_hashing()
+    await task_queue.start()
+    async with broker_lifespan(), view_counter_lifespan():
+        yield
+    await task_queue.stop()
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.project_name,
     version="1.0.0",
     description="A secure Blog API with authentication built with FastAPI",
     openapi_url=f"{settings.api_v1_str}/openapi.json",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -26,6 +48,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling; not installed at all unless enabled
+if settings.profiler_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+# Replay responses for retried creates carrying an Idempotency-Key
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths={f"{settings.api_v1_str}/posts/", f"{settings.api_v1_str}/auth/signup"},
+)
+
+# Outermost: shed excess load before doing any work for it
+app.add_middleware(
+    LoadSheddingMiddleware,
+    auth_prefix=f"{settings.api_v1_str}/auth/",
+    exempt={"/health", f"{settings.api_v1_str}/posts/stream"},
+)
+
 # Include routers
 app.include_router(auth.router, prefix=settings.api_v1_str)
 app.include_router(users.router, prefix=settings.api_v1_str)
@@ -45,5 +84,9 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+    """Readiness probe: 503 while this worker is saturated or shedding load."""
+    if not limiter.ready:
+        return JSONResponse(
+            status_code=503, content={"status": "overloaded", **limiter.snapshot()}
+        )
+    return {"status": "healthy", **limiter.snapshot()}
@@ -1,9 +1,71 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+import zlib
+from typing import List, Optional
+
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    Sequence,
+    String,
+    Text,
+)
+from sqlalchemy.orm import deferred, relationship, validates
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 
+from app.config import settings
 from app.database import Base
 
+# Marks a zlib-compressed value; plain UTF-8 text never starts with a NUL
+# byte, because any text that does is always stored compressed
+_COMPRESSED = b"\x00"
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as bytes, zlib-compressed above a size threshold.
+
+    Compression is controlled by `Settings.post_content_compression` at write
+    time; values are always decompressed transparently on read.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        data = value.encode("utf-8")
+        if data.startswith(_COMPRESSED) or (
+            settings.post_content_compression
+            and len(data) >= settings.post_content_compression_threshold
+        ):
+            return _COMPRESSED + zlib.compress(data)
+        return data
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        value = bytes(value)
+        if value.startswith(_COMPRESSED):
+            value = zlib.decompress(value[len(_COMPRESSED) :])
+        return value.decode("utf-8")
+
+
+def make_excerpt(content: str, length: Optional[int] = None) -> str:
+    """Whitespace-normalized start of `content`, cut at a word boundary."""
+    length = length or settings.post_excerpt_length
+    text = " ".join(content.split())
+    if len(text) <= length:
+        return text
+    cut = text[: length - 1]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" .,;:") + "…"
+
 
 class User(Base):
     __tablename__ = "users"
@@ -16,8 +78,20 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    # Relationship
-    posts = relationship("Post", back_populates="author")
+    # Denormalized post counters, maintained by crud and rebuilt by
+    # `python -m app.cli reconcile-counters`
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    published_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_post_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationship; posts are removed by ON DELETE CASCADE in the database,
+    # so deleting a user never loads them
+    posts = relationship(
+        "Post",
+        back_populates="author",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
 class Post(Base):
@@ -25,13 +99,141 @@ class Post(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
+    # Not loaded by default; list queries only read the excerpt
+    content = deferred(Column(CompressedText, nullable=False))
+    excerpt = Column(String, nullable=False, default="", server_default="")
     published = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Buffered per worker and added in batches by app.views
+    view_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Bumped on every UPDATE; writes against a stale version fail
+    version = Column(Integer, nullable=False, server_default="1")
+
     # Foreign key
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    author_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False
+    )
 
     # Relationship
     author = relationship("User", back_populates="posts")
+    # Loaded for a whole page of posts with one IN query
+    tag_links = relationship(
+        "PostTag",
+        lazy="selectin",
+        order_by="PostTag.tag",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+    @validates("content")
+    def _update_excerpt(self, key, content):
+        self.excerpt = make_excerpt(content)
+        return content
+
+    @property
+    def tags(self) -> List[str]:
+        return [link.tag for link in self.tag_links]
+
+    @tags.setter
+    def tags(self, tags: Optional[List[str]]) -> None:
+        # Keep existing links, so unchanged tags are not deleted and re-added
+        current = {link.tag: link for link in self.tag_links}
+        self.tag_links = [current.get(tag) or PostTag(tag=tag) for tag in tags or []]
+
+
+class PostTag(Base):
+    """A tag on a post; the primary key serves tag filtering newest first."""
+
+    __tablename__ = "post_tags"
+
+    tag = Column(String(50), primary_key=True)
+    # A trigger replaces this foreign key when posts is partitioned
+    post_id = Column(
+        Integer,
+        ForeignKey("posts.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+
+
+class FeedEntry(Base):
+    """Narrow copy of each published post, newest publications last.
+
+    Maintained by crud in the same transaction as the post write, so the
+    homepage feed never touches `posts` or `users`.
+    """
+
+    __tablename__ = "published_feed"
+
+    # Feed position: every (re)publication gets a new, higher id
+    id = Column(Integer, primary_key=True)
+    # A trigger replaces this foreign key when posts is partitioned
+    post_id = Column(
+        Integer,
+        ForeignKey("posts.id", ondelete="CASCADE"),
+        unique=True,
+        nullable=False,
+    )
+    title = Column(String, nullable=False)
+    author_id = Column(Integer, index=True, nullable=False)
+    author_username = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+    published_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# Ids of post stream events, shared by every worker (PostgreSQL only; the
+# other databases skip it). Declared here so create_all builds it too.
+post_event_ids = Sequence("post_event_id_seq", metadata=Base.metadata)
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # SHA-256 of the opaque token; the token itself is never stored
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    # Tokens issued by rotating one another share a family, so reuse of a
+    # rotated token can revoke the whole chain
+    family_id = Column(String(32), index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Foreign key
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False
+    )
+
+    # Relationship
+    user = relationship("User")
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set by the process handling the event; stale claims are replayed
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # SHA-256 of the path, caller and client-supplied key
+    key = Column(String(64), primary_key=True)
+    # SHA-256 of the request body the key was first used with
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    headers = Column(JSON, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
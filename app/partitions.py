@@ -0,0 +1,294 @@
+"""Monthly range partitions of `posts` by `created_at` (PostgreSQL only).
+
+The table is converted by ``python -m app.cli partition-posts`` (and back
+by ``unpartition-posts``); ``python -m app.cli partitions`` then keeps
+future months created and archives old ones.
+
+Partitioning is for archiving, not for reads: the API looks posts up by id,
+author or tag, never by date, so those queries cannot be pruned and probe
+every partition's index instead of one.
+"""
+
+from datetime import date
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.crud import reconcile_user_counters
+
+PREFIX = "posts_p"
+# Catches rows outside every monthly partition, e.g. clock-skewed inserts
+DEFAULT_PARTITION = "posts_default"
+# Stand-ins for the foreign keys onto posts(id), by trigger name
+_DELETE_TRIGGERS = {
+    "posts_delete_feed_entry": "published_feed",
+    "posts_delete_tags": "post_tags",
+}
+
+
+def add_months(month: date, count: int) -> date:
+    """First day of the month `count` months after `month`'s."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PREFIX}{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """The month a partition covers, or None for other tables (e.g. default)."""
+    suffix = name[len(PREFIX) :]
+    if not name.startswith(PREFIX) or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def partitions_to_archive(
+    names: Iterable[str], today: date, retain_months: int
+) -> List[str]:
+    """Partitions holding only posts older than `retain_months` full months."""
+    cutoff = add_months(today.replace(day=1), -retain_months)
+    return sorted(
+        name
+        for name in names
+        if partition_month(name) is not None and partition_month(name) < cutoff
+    )
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(
+        db.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass('posts')"
+            )
+        ).first()
+    )
+
+
+def _bound(month: date) -> str:
+    """Start of `month` in UTC, as a timestamptz literal."""
+    return f"{month} 00:00:00+00"
+
+
+def _create_partition(db: Session, month: date) -> str:
+    name = partition_name(month)
+    db.execute(
+        text(
+            f"CREATE TABLE {name} PARTITION OF posts FOR VALUES "
+            f"FROM ('{_bound(month)}') TO ('{_bound(add_months(month, 1))}')"
+        )
+    )
+    return name
+
+
+def _create_delete_trigger(db: Session, name: str, table: str) -> None:
+    """Delete a post's rows in `table` with it, replacing a foreign key."""
+    db.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$
+            BEGIN
+                DELETE FROM {table} WHERE post_id = OLD.id;
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql
+            """))
+    db.execute(
+        text(
+            f"CREATE TRIGGER {name} AFTER DELETE ON posts "
+            f"FOR EACH ROW EXECUTE FUNCTION {name}()"
+        )
+    )
+
+
+def partition_posts(db: Session, today: date, months_ahead: int) -> List[str]:
+    """Convert `posts` into monthly partitions, copying every row.
+
+    Runs in one transaction, holding an exclusive lock on posts throughout.
+    The primary key becomes (id, created_at), since PostgreSQL requires the
+    partition key in every unique constraint; ids stay unique through their
+    sequence. Foreign keys cannot reference a partitioned table by id alone,
+    so the feed's and tags' cascades become triggers.
+    """
+    for table in ("published_feed", "post_tags"):
+        db.execute(
+            text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_post_id_fkey")
+        )
+    for statement in (
+        "ALTER TABLE posts RENAME TO posts_unpartitioned",
+        "ALTER INDEX ix_posts_id RENAME TO ix_posts_unpartitioned_id",
+        "ALTER INDEX ix_posts_author_id RENAME TO ix_posts_unpartitioned_author_id",
+        "ALTER TABLE posts_unpartitioned "
+        "RENAME CONSTRAINT posts_pkey TO posts_unpartitioned_pkey",
+        "ALTER TABLE posts_unpartitioned "
+        "RENAME CONSTRAINT posts_author_id_fkey TO posts_unpartitioned_author_id_fkey",
+        "UPDATE posts_unpartitioned SET created_at = now() WHERE created_at IS NULL",
+        "CREATE TABLE posts (LIKE posts_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)",
+        "ALTER TABLE posts ALTER COLUMN created_at SET NOT NULL",
+        "ALTER TABLE posts ADD CONSTRAINT posts_pkey PRIMARY KEY (id, created_at)",
+        "ALTER TABLE posts ADD CONSTRAINT posts_author_id_fkey "
+        "FOREIGN KEY (author_id) REFERENCES users (id) ON DELETE CASCADE",
+        "CREATE INDEX ix_posts_id ON posts (id)",
+        "CREATE INDEX ix_posts_author_id ON posts (author_id)",
+        "ALTER SEQUENCE posts_id_seq OWNED BY posts.id",
+    ):
+        db.execute(text(statement))
+
+    first = db.scalar(
+        text(
+            "SELECT date_trunc('month', min(created_at) AT TIME ZONE 'UTC') "
+            "FROM posts_unpartitioned"
+        )
+    )
+    this_month = today.replace(day=1)
+    month = first.date() if first is not None else this_month
+    created = []
+    while month <= add_months(this_month, months_ahead):
+        created.append(_create_partition(db, month))
+        month = add_months(month, 1)
+    db.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF posts DEFAULT"))
+
+    db.execute(text("INSERT INTO posts SELECT * FROM posts_unpartitioned"))
+    db.execute(text("DROP TABLE posts_unpartitioned"))
+    for name, table in _DELETE_TRIGGERS.items():
+        _create_delete_trigger(db, name, table)
+    db.commit()
+    return created
+
+
+def unpartition_posts(db: Session) -> None:
+    """Convert `posts` back into a plain table, in one transaction.
+
+    Only posts in attached partitions are kept; archived partitions are
+    left where they are, and their feed rows and tags are already gone.
+    """
+    for name in _DELETE_TRIGGERS:
+        db.execute(text(f"DROP TRIGGER IF EXISTS {name} ON posts"))
+        db.execute(text(f"DROP FUNCTION IF EXISTS {name}()"))
+    for statement in (
+        "ALTER TABLE posts RENAME TO posts_partitioned",
+        "ALTER INDEX ix_posts_id RENAME TO ix_posts_partitioned_id",
+        "ALTER INDEX ix_posts_author_id RENAME TO ix_posts_partitioned_author_id",
+        "ALTER TABLE posts_partitioned "
+        "RENAME CONSTRAINT posts_pkey TO posts_partitioned_pkey",
+        "ALTER TABLE posts_partitioned "
+        "RENAME CONSTRAINT posts_author_id_fkey TO posts_partitioned_author_id_fkey",
+        "CREATE TABLE posts (LIKE posts_partitioned INCLUDING DEFAULTS)",
+        "ALTER TABLE posts ALTER COLUMN created_at DROP NOT NULL",
+        "INSERT INTO posts SELECT * FROM posts_partitioned",
+        "ALTER SEQUENCE posts_id_seq OWNED BY posts.id",
+        # Drops every attached partition with it
+        "DROP TABLE posts_partitioned",
+        "ALTER TABLE posts ADD CONSTRAINT posts_pkey PRIMARY KEY (id)",
+        "ALTER TABLE posts ADD CONSTRAINT posts_author_id_fkey "
+        "FOREIGN KEY (author_id) REFERENCES users (id) ON DELETE CASCADE",
+        "CREATE INDEX ix_posts_id ON posts (id)",
+        "CREATE INDEX ix_posts_author_id ON posts (author_id)",
+    ):
+        db.execute(text(statement))
+    for table in ("published_feed", "post_tags"):
+        db.execute(
+            text(f"DELETE FROM {table} WHERE post_id NOT IN (SELECT id FROM posts)")
+        )
+        db.execute(
+            text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {table}_post_id_fkey "
+                "FOREIGN KEY (post_id) REFERENCES posts (id) ON DELETE CASCADE"
+            )
+        )
+    db.commit()
+
+
+def list_partitions(db: Session) -> List[str]:
+    return list(
+        db.scalars(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'posts'::regclass"
+            )
+        )
+    )
+
+
+def _default_holds(db: Session, months: List[date]) -> bool:
+    """Whether the default partition has rows in any of these months."""
+    return any(
+        db.execute(
+            text(
+                f"SELECT 1 FROM {DEFAULT_PARTITION} "
+                "WHERE created_at >= CAST(:start AS timestamptz) "
+                "AND created_at < CAST(:end AS timestamptz) LIMIT 1"
+            ),
+            {"start": _bound(month), "end": _bound(add_months(month, 1))},
+        ).first()
+        for month in months
+    )
+
+
+def create_partitions(db: Session, today: date, months_ahead: int) -> List[str]:
+    """Create any missing partitions from this month to `months_ahead` ahead.
+
+    PostgreSQL refuses a new partition while the default partition holds
+    rows in its range, so those are set aside and routed again: the default
+    partition is copied, dropped, and recreated after the new months.
+    """
+    existing = set(list_partitions(db))
+    months = [
+        add_months(today.replace(day=1), offset) for offset in range(months_ahead + 1)
+    ]
+    months = [month for month in months if partition_name(month) not in existing]
+    if not months:
+        return []
+    reroute = DEFAULT_PARTITION in existing and _default_holds(db, months)
+    if reroute:
+        db.execute(
+            text(
+                "CREATE TEMP TABLE posts_rerouted ON COMMIT DROP AS "
+                f"SELECT * FROM {DEFAULT_PARTITION}"
+            )
+        )
+        # Dropping, unlike DELETE, does not fire the posts delete triggers
+        db.execute(text(f"DROP TABLE {DEFAULT_PARTITION}"))
+    created = [_create_partition(db, month) for month in months]
+    if reroute:
+        db.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF posts DEFAULT"))
+        db.execute(text("INSERT INTO posts SELECT * FROM posts_rerouted"))
+    db.commit()
+    return created
+
+
+def archive_partitions(
+    db: Session,
+    today: date,
+    retain_months: int,
+    schema: str = "archive",
+    drop: bool = False,
+) -> List[str]:
+    """Detach partitions older than `retain_months` and archive or drop them.
+
+    Archived posts lose their tags and disappear from the feed and from
+    their authors' counters, all in one transaction.
+    """
+    archived = partitions_to_archive(list_partitions(db), today, retain_months)
+    if not archived:
+        return []
+    if not drop:
+        db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+    for name in archived:
+        db.execute(text(f"ALTER TABLE posts DETACH PARTITION {name}"))
+        for table in ("published_feed", "post_tags"):
+            db.execute(
+                text(f"DELETE FROM {table} WHERE post_id IN (SELECT id FROM {name})")
+            )
+        if drop:
+            db.execute(text(f"DROP TABLE {name}"))
+        else:
+            db.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+    reconcile_user_counters(db, commit=False)
+    db.commit()
+    return archived
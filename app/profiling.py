@@ -0,0 +1,165 @@
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+from app.config import settings
+
+# Threads are only sampled while they run request-handling code
+_REQUEST_MODULES = ("app.", "fastapi.", "starlette.")
+
+
+def _frame_label(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{frame.f_code.co_qualname}"
+
+
+class StackSampler:
+    """Samples the stacks of every request-handling thread at an interval.
+
+    Sync endpoints, dependencies and response validation run in threadpool
+    threads, which a per-thread profiler such as cProfile would miss. The
+    output is in the collapsed-stack format ("frame;frame;frame count") read
+    by flamegraph.pl, speedscope and inferno. Requests running concurrently
+    in the same worker show up in the samples too.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if not any(label.startswith(_REQUEST_MODULES) for label in stack):
+                    continue
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+
+def _authorized(token: Optional[bytes]) -> bool:
+    expected = settings.profiler_token
+    return bool(
+        token and expected and hmac.compare_digest(token, expected.encode("utf-8"))
+    )
+
+
+def _profile_name(scope) -> str:
+    path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+    stamp = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{os.urandom(3).hex()}"
+    return f"{stamp}-{scope['method']}-{path}"
+
+
+class ProfilingMiddleware:
+    """Profile single requests on demand; only installed when enabled.
+
+    A request is profiled when it carries `X-Profile: <PROFILER_TOKEN>`, or
+    at random for `PROFILER_SAMPLE_RATE` of all requests. The profile is
+    written to `PROFILER_OUTPUT_DIR`; token-authorized requests get its name
+    in the `X-Profile-File` response header, or may send
+    `X-Profile-Output: attachment` to receive the profile in place of the
+    response. Randomly sampled requests are not told they were profiled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        authorized = _authorized(headers.get(b"x-profile"))
+        if not authorized and random.random() >= settings.profiler_sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        attachment = authorized and headers.get(b"x-profile-output") == b"attachment"
+        name = _profile_name(scope)
+        messages: List[dict] = []
+
+        async def send_wrapper(message):
+            if attachment:
+                messages.append(message)
+                return
+            if authorized and message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"x-profile-file", f"{name}.collapsed".encode()),
+                    ],
+                }
+            await send(message)
+
+        sampler = StackSampler(settings.profiler_interval_ms / 1000)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            profile = sampler.collapsed()
+
+        if attachment:
+            status = next(
+                (m["status"] for m in messages if m["type"] == "http.response.start"),
+                500,
+            )
+            await _send_attachment(send, f"{name}.collapsed", profile, status)
+        else:
+            await asyncio.to_thread(_write_profile, f"{name}.collapsed", profile)
+
+
+def _write_profile(filename: str, profile: str) -> None:
+    os.makedirs(settings.profiler_output_dir, exist_ok=True)
+    with open(os.path.join(settings.profiler_output_dir, filename), "w") as f:
+        f.write(profile)
+
+
+async def _send_attachment(send, filename: str, profile: str, status: int) -> None:
+    body = profile.encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (
+                    b"content-disposition",
+                    f'attachment; filename="{filename}"'.encode(),
+                ),
+                (b"x-profiled-status", str(status).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
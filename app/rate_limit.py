@@ -0,0 +1,212 @@
+import math
+import threading
+import time
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+from app.config import settings
+
+# Atomic token bucket for Redis-compatible servers. Returns {allowed, retry_after_ms}.
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, retry_after}
+"""
+
+
+class RateLimitStore:
+    """Storage backend for token buckets."""
+
+    def consume(
+        self, key: str, capacity: int, refill_rate: float, cost: int = 1
+    ) -> Tuple[bool, float]:
+        """Take `cost` tokens from a bucket.
+
+        Returns whether the request is allowed and, if not, the number of
+        seconds until enough tokens are available.
+        """
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Forget all buckets."""
+        raise NotImplementedError
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Per-process token buckets kept in a dictionary."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(
+        self, key: str, capacity: int, refill_rate: float, cost: int = 1
+    ) -> Tuple[bool, float]:
+        now = time.monotonic()
+        # Time for the bucket to refill completely, after which it can go
+        idle = capacity / refill_rate
+        with self._lock:
+            tokens, last, _ = self._buckets.get(key, (capacity, now, idle))
+            tokens = min(capacity, tokens + (now - last) * refill_rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now, idle)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now, idle)
+                allowed, retry_after = False, (cost - tokens) / refill_rate
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float) -> None:
+        """Drop buckets that have had time to refill completely."""
+        self._buckets = {
+            key: state
+            for key, state in self._buckets.items()
+            if now - state[1] < state[2]
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Token buckets shared between processes through a Redis-compatible server."""
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def consume(
+        self, key: str, capacity: int, refill_rate: float, cost: int = 1
+    ) -> Tuple[bool, float]:
+        allowed, retry_after_ms = self._script(
+            keys=[self.prefix + key],
+            args=[capacity, refill_rate, cost, time.time()],
+        )
+        return bool(allowed), int(retry_after_ms) / 1000
+
+    def reset(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class RateLimiter:
+    """A named token bucket policy applied to arbitrary keys."""
+
+    def __init__(self, name: str, capacity: int, per_minute: float):
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = per_minute / 60
+
+    def hit(self, key: str) -> None:
+        """Consume a token for `key`, raising 429 when the bucket is empty."""
+        if not settings.rate_limit_enabled:
+            return
+        allowed, retry_after = get_store().consume(
+            f"{self.name}:{key}", self.capacity, self.refill_rate
+        )
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+_store: Optional[RateLimitStore] = None
+
+
+def create_store(url: Optional[str]) -> RateLimitStore:
+    """Build a store from a `memory://` or `redis://` URL."""
+    if not url or url.startswith("memory://"):
+        return InMemoryRateLimitStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError(
+                f"The 'redis' package is required for storage URL {url!r}"
+            ) from exc
+        return RedisRateLimitStore(redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported rate limit storage URL: {url!r}")
+
+
+def get_store() -> RateLimitStore:
+    """Return the process-wide rate limit store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_store(settings.rate_limit_storage_url)
+    return _store
+
+
+def set_store(store: Optional[RateLimitStore]) -> None:
+    """Replace the process-wide rate limit store."""
+    global _store
+    _store = store
+
+
+def client_ip(request: Request) -> str:
+    """Best-effort client address, honouring X-Forwarded-For behind a proxy.
+
+    Clients can send any X-Forwarded-For they like, so only the hops
+    appended by our own `RATE_LIMIT_TRUSTED_PROXIES` proxies are believed:
+    the address is read that many entries from the right.
+    """
+    if settings.rate_limit_trust_proxy:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.split(",")]
+            return hops[-min(settings.rate_limit_trusted_proxies, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+
+login_ip_limiter = RateLimiter(
+    "login-ip",
+    settings.login_rate_limit_ip_burst,
+    settings.login_rate_limit_ip_per_minute,
+)
+login_user_limiter = RateLimiter(
+    "login-user",
+    settings.login_rate_limit_user_burst,
+    settings.login_rate_limit_user_per_minute,
+)
+signup_ip_limiter = RateLimiter(
+    "signup-ip",
+    settings.signup_rate_limit_ip_burst,
+    settings.signup_rate_limit_ip_per_minute,
+)
+
+
+def limit_login(
+    request: Request, form_data: OAuth2PasswordRequestForm = Depends()
+) -> None:
+    """Throttle login attempts per client IP and per username."""
+    login_ip_limiter.hit(client_ip(request))
+    login_user_limiter.hit(form_data.username.lower())
+
+
+def limit_signup(request: Request) -> None:
+    """Throttle signups per client IP."""
+    signup_ip_limiter.hit(client_ip(request))
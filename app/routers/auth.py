@@ -4,40 +4,56 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app.auth import authenticate_user, create_access_token, get_current_active_user
+from app.auth import (
+    authenticate_user,
+    create_access_token,
+    create_refresh_token,
+    get_current_active_user,
+    revoke_refresh_token,
+    rotate_refresh_token,
+)
 from app.config import settings
-from app.crud import create_user, get_user_by_email, get_user_by_username
+from app.crud import DuplicateValueError, create_user
 from app.database import get_db
-from app.schemas import Token, User, UserCreate
+from app.rate_limit import limit_login, limit_signup
+from app.routers.common import duplicate_value_error
+from app.schemas import RefreshRequest, Token, User, UserCreate
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
-@router.post("/signup", response_model=User, status_code=status.HTTP_201_CREATED)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user."""
-    # Check if user with email already exists
-    db_user = get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
-        )
+def _token_response(username: str, refresh_token: str) -> dict:
+    """Build the token payload returned by login and refresh."""
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    access_token = create_access_token(
+        data={"sub": username}, expires_delta=access_token_expires
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
 
-    # Check if username already exists
-    db_user = get_user_by_username(db, username=user.username)
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
-        )
 
-    return create_user(db=db, user=user)
+@router.post(
+    "/signup",
+    response_model=User,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(limit_signup)],
+)
+def signup(user: UserCreate, db: Session = Depends(get_db)):
+    """Register a new user."""
+    try:
+        return create_user(db=db, user=user)
+    except DuplicateValueError as exc:
+        raise duplicate_value_error(exc)
 
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(limit_login)])
 def login(
     form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
 ):
-    """Login user and return access token."""
+    """Login user and return access and refresh tokens."""
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -46,11 +62,29 @@ def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return _token_response(user.username, create_refresh_token(db, user.id))
+
+
+@router.post("/refresh", response_model=Token)
+def refresh(body: RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token and refresh token."""
+    rotated = rotate_refresh_token(db, body.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user, refresh_token = rotated
+    return _token_response(user.username, refresh_token)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(body: RefreshRequest, db: Session = Depends(get_db)):
+    """Revoke a refresh token and all tokens rotated from the same login."""
+    revoke_refresh_token(db, body.refresh_token)
+    return None
 
 
 @router.get("/me", response_model=User)
@@ -0,0 +1,39 @@
+from typing import List
+
+from fastapi import HTTPException, Query, status
+
+from app.config import settings
+from app.crud import DuplicateValueError
+
+
+def batch_ids(
+    ids: str = Query(..., description="Comma-separated IDs, e.g. 1,2,3")
+) -> List[int]:
+    """Parse and de-duplicate the `ids` of a batch request, keeping order."""
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must be a comma-separated list of integers",
+        )
+    unique = list(dict.fromkeys(parsed))
+    if not unique:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must not be empty",
+        )
+    if len(unique) > settings.batch_max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.batch_max_ids} ids per request",
+        )
+    return unique
+
+
+def duplicate_value_error(exc: DuplicateValueError) -> HTTPException:
+    """The 400 response for an email or username that is already taken."""
+    detail = (
+        "Email already registered" if exc.field == "email" else "Username already taken"
+    )
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
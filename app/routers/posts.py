@@ -1,63 +1,230 @@
-from typing import List
+from typing import List, Literal, Optional, Set, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.auth import get_current_active_user
+from app.broker import event_stream
+from app.config import settings
 from app.crud import (
+    VersionConflictError,
     create_post,
     delete_post,
+    get_feed,
     get_post,
     get_posts,
+    get_posts_by_ids,
+    get_posts_by_tag,
     get_user_posts,
+    patch_post,
     update_post,
 )
 from app.database import get_db
 from app.models import User
-from app.schemas import Post, PostCreate, PostUpdate
+from app.routers.common import batch_ids
+from app.schemas import (
+    FeedItem,
+    Post,
+    PostBatch,
+    PostCreate,
+    PostListItem,
+    PostSummary,
+    PostUpdate,
+    normalize_tag,
+)
+from app.singleflight import SingleFlight
+from app.views import view_counter
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+# Identical concurrent reads share one query; results are serialized while
+# the leader's session is open, so followers never touch ORM objects
+reads = SingleFlight(window=settings.read_coalescing_window_ms / 1000)
+
+# List endpoints return full posts unless asked for `fields=summary`, which
+# swaps the content for its excerpt and never loads it from the database
+ListFields = Literal["full", "summary"]
+PostList = Union[List[Post], List[PostListItem]]
+
+
+def _list_items(posts, fields: ListFields) -> list:
+    schema = PostListItem if fields == "summary" else Post
+    return [schema.model_validate(post) for post in posts]
+
+
+def _shared_read(key, fn):
+    if not settings.read_coalescing_enabled:
+        return fn()
+    return reads.do(key, fn)
+
 
-@router.get("/", response_model=List[Post])
+def _etag(post) -> str:
+    """Strong entity tag for a post, derived from its version column."""
+    return f'"{post.version}"'
+
+
+def _parse_if_match(value: Optional[str]) -> Optional[Set[int]]:
+    """Versions accepted by an If-Match header; None means any version."""
+    if value is None or value.strip() == "*":
+        return None
+    versions = set()
+    for tag in value.split(","):
+        tag = tag.strip()
+        # If-Match uses strong comparison, so weak tags never match
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            versions.add(int(tag[1:-1]))
+    return versions
+
+
+@router.get("/", response_model=PostList)
 def read_posts(
     skip: int = 0,
     limit: int = 100,
     published_only: bool = False,
+    tag: Optional[str] = None,
+    before: Optional[int] = None,
+    fields: ListFields = "full",
+    db: Session = Depends(get_db),
+):
+    """Get all posts with pagination.
+
+    With `tag`, only posts carrying it are returned, newest first; pass the
+    last post's `id` as `before` to get the next page. `skip` with `tag`,
+    and `before` without it, are rejected with 422.
+    """
+    if tag is not None:
+        if skip:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Use `before` instead of `skip` to page through a tag",
+            )
+        tag = normalize_tag(tag)
+    elif before is not None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="`before` pages through a tag; use `skip` without one",
+        )
+
+    def load():
+        if tag is not None:
+            posts = get_posts_by_tag(
+                db,
+                tag,
+                limit=limit,
+                before=before,
+                published_only=published_only,
+                with_content=fields == "full",
+            )
+        else:
+            posts = get_posts(
+                db,
+                skip=skip,
+                limit=limit,
+                published_only=published_only,
+                with_content=fields == "full",
+            )
+        return _list_items(posts, fields)
+
+    key = ("posts", skip, limit, published_only, tag, before, fields)
+    return _shared_read(key, load)
+
+
+@router.get("/feed", response_model=List[FeedItem])
+def read_feed(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[int] = None,
     db: Session = Depends(get_db),
 ):
-    """Get all posts with pagination."""
-    posts = get_posts(db, skip=skip, limit=limit, published_only=published_only)
-    return posts
+    """Newest published posts, served from the precomputed feed table.
+
+    Pass the last item's `position` as `before` to get the next page.
+    """
+    return [
+        FeedItem(
+            position=entry.id,
+            post_id=entry.post_id,
+            title=entry.title,
+            author_id=entry.author_id,
+            author_username=entry.author_username,
+            created_at=entry.created_at,
+            published_at=entry.published_at,
+        )
+        for entry in get_feed(db, limit=limit, before=before)
+    ]
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_published_posts(last_event_id: Optional[int] = Header(None)):
+    """Stream newly published posts as server-sent events.
+
+    Each `post.published` event carries the post's id, author and title.
+    Reconnect with `Last-Event-ID` to receive what was missed.
+    """
+    return StreamingResponse(
+        event_stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/batch", response_model=PostBatch)
+def read_posts_batch(
+    ids: List[int] = Depends(batch_ids), db: Session = Depends(get_db)
+):
+    """Get several posts by ID in one request, in the order requested."""
+    found = get_posts_by_ids(db, ids)
+    return {
+        "items": [found[post_id] for post_id in ids if post_id in found],
+        "missing": [post_id for post_id in ids if post_id not in found],
+    }
 
 
 @router.get("/{post_id}", response_model=Post)
-def read_post(post_id: int, db: Session = Depends(get_db)):
+def read_post(post_id: int, response: Response, db: Session = Depends(get_db)):
     """Get a specific post by ID."""
-    db_post = get_post(db, post_id=post_id)
-    if db_post is None:
+
+    def load():
+        db_post = get_post(db, post_id=post_id)
+        return None if db_post is None else Post.model_validate(db_post)
+
+    post = _shared_read(("post", post_id), load)
+    if post is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    return db_post
+    if settings.view_counts_enabled:
+        view_counter.record(post_id)
+    response.headers["ETag"] = _etag(post)
+    return post
 
 
 @router.post("/", response_model=Post, status_code=status.HTTP_201_CREATED)
 def create_new_post(
     post: PostCreate,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
     """Create a new post."""
-    return create_post(db=db, post=post, user_id=current_user.id)
+    db_post = create_post(db=db, post=post, user_id=current_user.id)
+    reads.forget()
+    response.headers["ETag"] = _etag(db_post)
+    return db_post
 
 
 @router.put("/{post_id}", response_model=Post)
 def update_post_info(
     post_id: int,
     post_update: PostUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
-    """Update post information (only own posts)."""
+    """Update post information (only own posts).
+
+    Send the post's ETag in `If-Match` to update only if nobody else has
+    changed it since; a mismatch returns 412 Precondition Failed.
+    """
     db_post = get_post(db, post_id=post_id)
     if db_post is None:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -67,10 +234,62 @@ def update_post_info(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions"
         )
 
-    updated_post = update_post(db, post_id=post_id, post_update=post_update)
+    try:
+        updated_post = update_post(
+            db,
+            post_id=post_id,
+            post_update=post_update,
+            if_match=_parse_if_match(if_match),
+        )
+    except VersionConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Post has been modified",
+        )
+    reads.forget()
+    response.headers["ETag"] = _etag(updated_post)
     return updated_post
 
 
+@router.patch("/{post_id}", response_model=PostSummary)
+def patch_post_info(
+    post_id: int,
+    post_update: PostUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Partially update a post (only own posts).
+
+    Writes only the supplied fields in a single statement and returns the
+    post without its content. Supports `If-Match` like PUT.
+    """
+    row = patch_post(
+        db,
+        post_id=post_id,
+        post_update=post_update,
+        author_id=current_user.id,
+        if_match=_parse_if_match(if_match),
+    )
+    if row is None:
+        # Work out why nothing matched; only failed writes pay for this read
+        db_post = get_post(db, post_id=post_id)
+        if db_post is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        if db_post.author_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Post has been modified",
+        )
+    reads.forget()
+    response.headers["ETag"] = _etag(row)
+    return row
+
+
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_post_by_id(
     post_id: int,
@@ -88,27 +307,41 @@ def delete_post_by_id(
         )
 
     success = delete_post(db, post_id=post_id)
+    reads.forget()
     if not success:
         raise HTTPException(status_code=404, detail="Post not found")
     return None
 
 
-@router.get("/user/{user_id}", response_model=List[Post])
+@router.get("/user/{user_id}", response_model=PostList)
 def read_user_posts(
-    user_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    fields: ListFields = "full",
+    db: Session = Depends(get_db),
 ):
     """Get all posts by a specific user."""
-    posts = get_user_posts(db, user_id=user_id, skip=skip, limit=limit)
-    return posts
+    posts = get_user_posts(
+        db, user_id=user_id, skip=skip, limit=limit, with_content=fields == "full"
+    )
+    return _list_items(posts, fields)
 
 
-@router.get("/my/posts", response_model=List[Post])
+@router.get("/my/posts", response_model=PostList)
 def read_my_posts(
     skip: int = 0,
     limit: int = 100,
+    fields: ListFields = "full",
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
     """Get current user's posts."""
-    posts = get_user_posts(db, user_id=current_user.id, skip=skip, limit=limit)
-    return posts
+    posts = get_user_posts(
+        db,
+        user_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        with_content=fields == "full",
+    )
+    return _list_items(posts, fields)
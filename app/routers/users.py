@@ -4,10 +4,19 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.auth import get_current_active_user
-from app.crud import delete_user, get_user, get_users, update_user
+from app.crud import (
+    DuplicateValueError,
+    delete_user,
+    get_user,
+    get_users,
+    get_users_by_ids,
+    patch_user,
+    update_user,
+)
 from app.database import get_db
 from app.models import User as UserModel
-from app.schemas import User, UserUpdate
+from app.routers.common import batch_ids, duplicate_value_error
+from app.schemas import User, UserBatch, UserStats, UserUpdate
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -19,6 +28,18 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return users
 
 
+@router.get("/batch", response_model=UserBatch)
+def read_users_batch(
+    ids: List[int] = Depends(batch_ids), db: Session = Depends(get_db)
+):
+    """Get several users by ID in one request, in the order requested."""
+    found = get_users_by_ids(db, ids)
+    return {
+        "items": [found[user_id] for user_id in ids if user_id in found],
+        "missing": [user_id for user_id in ids if user_id not in found],
+    }
+
+
 @router.get("/{user_id}", response_model=User)
 def read_user(user_id: int, db: Session = Depends(get_db)):
     """Get a specific user by ID."""
@@ -28,6 +49,21 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
     return db_user
 
 
+@router.get("/{user_id}/stats", response_model=UserStats)
+def read_user_stats(user_id: int, db: Session = Depends(get_db)):
+    """Get a user's post counters."""
+    db_user = get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserStats(
+        user_id=db_user.id,
+        post_count=db_user.post_count,
+        published_count=db_user.published_count,
+        draft_count=db_user.post_count - db_user.published_count,
+        last_post_at=db_user.last_post_at,
+    )
+
+
 @router.put("/{user_id}", response_model=User)
 def update_user_info(
     user_id: int,
@@ -47,6 +83,28 @@ def update_user_info(
     return db_user
 
 
+@router.patch("/{user_id}", response_model=User)
+def patch_user_info(
+    user_id: int,
+    user_update: UserUpdate,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Partially update user information in a single statement (own profile)."""
+    if current_user.id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions"
+        )
+
+    try:
+        row = patch_user(db, user_id=user_id, user_update=user_update)
+    except DuplicateValueError as exc:
+        raise duplicate_value_error(exc)
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return row
+
+
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_user_account(
     user_id: int,
@@ -1,7 +1,26 @@
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
+
+MAX_TAGS = 10
+MAX_TAG_LENGTH = 50
+
+
+def normalize_tag(tag: str) -> str:
+    """Tags are compared case-insensitively and without surrounding spaces."""
+    return tag.strip().lower()
+
+
+def _normalize_tags(tags: Optional[List[str]]) -> Optional[List[str]]:
+    if tags is None:
+        return None
+    normalized = sorted({normalize_tag(tag) for tag in tags} - {""})
+    if len(normalized) > MAX_TAGS:
+        raise ValueError(f"at most {MAX_TAGS} tags are allowed")
+    if any(len(tag) > MAX_TAG_LENGTH for tag in normalized):
+        raise ValueError(f"tags are at most {MAX_TAG_LENGTH} characters long")
+    return normalized
 
 
 # User schemas
@@ -25,11 +44,27 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
+    post_count: int = 0
+    published_count: int = 0
+    last_post_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
 
+class UserBatch(BaseModel):
+    items: List[User]
+    missing: List[int]
+
+
+class UserStats(BaseModel):
+    user_id: int
+    post_count: int
+    published_count: int
+    draft_count: int
+    last_post_at: Optional[datetime] = None
+
+
 # Post schemas
 class PostBase(BaseModel):
     title: str
@@ -38,17 +73,26 @@ class PostBase(BaseModel):
 
 
 class PostCreate(PostBase):
-    pass
+    tags: List[str] = []
+
+    _normalize_tags = field_validator("tags")(_normalize_tags)
 
 
 class PostUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
     published: Optional[bool] = None
+    tags: Optional[List[str]] = None  # replaces all tags when given
+
+    _normalize_tags = field_validator("tags")(_normalize_tags)
 
 
 class Post(PostBase):
     id: int
+    excerpt: str
+    tags: List[str] = []
+    view_count: int
+    version: int
     created_at: datetime
     updated_at: Optional[datetime] = None
     author_id: int
@@ -58,10 +102,63 @@ class Post(PostBase):
         from_attributes = True
 
 
+class PostListItem(BaseModel):
+    """A post as shown in lists: an excerpt instead of the full content."""
+
+    id: int
+    title: str
+    excerpt: str
+    tags: List[str] = []
+    published: bool
+    version: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    author_id: int
+    author: User
+
+    class Config:
+        from_attributes = True
+
+
+class PostBatch(BaseModel):
+    items: List[Post]
+    missing: List[int]
+
+
+class PostSummary(BaseModel):
+    id: int
+    title: str
+    excerpt: str
+    tags: List[str] = []
+    published: bool
+    version: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    author_id: int
+
+    class Config:
+        from_attributes = True
+
+
+class FeedItem(BaseModel):
+    position: int
+    post_id: int
+    title: str
+    author_id: int
+    author_username: str
+    created_at: Optional[datetime] = None
+    published_at: Optional[datetime] = None
+
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
@@ -0,0 +1,133 @@
+"""Production server entrypoint: ``python -m app.serve``.
+
+Runs the app under gunicorn with uvicorn workers (uvloop + httptools), one
+worker per available CPU unless WEB_CONCURRENCY is set. Falls back to
+uvicorn's own process manager where gunicorn is unavailable (e.g. Windows).
+"""
+
+import math
+import os
+
+from app.config import settings
+
+APP = "app.main:app"
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honouring affinity and cgroup quotas."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2 quota, e.g. "50000 100000" for half a CPU or "max 100000"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """Number of worker processes to run."""
+    return settings.web_concurrency or available_cpus()
+
+
+def gunicorn_options() -> dict:
+    """Gunicorn settings derived from `Settings`."""
+    return {
+        "bind": f"{settings.server_host}:{settings.port}",
+        "workers": worker_count(),
+        "worker_class": "app.serve.UvicornWorker",
+        "max_requests": settings.server_max_requests,
+        "max_requests_jitter": settings.server_max_requests_jitter,
+        "keepalive": settings.server_keepalive,
+        "graceful_timeout": settings.server_graceful_timeout,
+        "timeout": settings.server_timeout,
+        "backlog": settings.server_backlog,
+        "accesslog": "-" if settings.server_access_log else None,
+        "errorlog": "-",
+    }
+
+
+def prepare_database() -> None:
+    """Create missing tables once, before any worker starts.
+
+    Workers would otherwise race each other through `create_all` on a fresh
+    database. The pool is disposed so no connection is inherited by forks.
+    """
+    from app.database import engine
+    from app.models import Base
+
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+
+try:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn.workers import UvicornWorker as _BaseUvicornWorker
+except ImportError:  # pragma: no cover - gunicorn is not available on Windows
+    BaseApplication = None
+else:
+
+    class UvicornWorker(_BaseUvicornWorker):
+        """Uvicorn worker using the event loop and HTTP parser from `Settings`."""
+
+        CONFIG_KWARGS = {
+            "loop": settings.server_loop,
+            "http": settings.server_http,
+            "proxy_headers": settings.rate_limit_trust_proxy,
+        }
+
+    class GunicornApplication(BaseApplication):
+        """Embedded gunicorn configured from a dictionary."""
+
+        def __init__(self, app_uri: str, options: dict):
+            self.app_uri = app_uri
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            from gunicorn.util import import_app
+
+            return import_app(self.app_uri)
+
+
+def run_uvicorn() -> None:
+    """Fallback: uvicorn's built-in multiprocess supervisor."""
+    import uvicorn
+
+    uvicorn.run(
+        APP,
+        host=settings.server_host,
+        port=settings.port,
+        workers=worker_count(),
+        loop=settings.server_loop,
+        http=settings.server_http,
+        limit_max_requests=settings.server_max_requests or None,
+        timeout_keep_alive=settings.server_keepalive,
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        backlog=settings.server_backlog,
+        access_log=settings.server_access_log,
+        proxy_headers=settings.rate_limit_trust_proxy,
+    )
+
+
+def main() -> None:
+    prepare_database()
+    if BaseApplication is None:
+        run_uvicorn()
+    else:
+        GunicornApplication(APP, gunicorn_options()).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one call's result between concurrent callers with the same key.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs (or up to `window` seconds after it finished) block for and receive
+    the same result or exception. Results are shared between threads, so
+    they must be immutable or at least never modified by callers.
+    """
+
+    def __init__(self, window: float = 0.0, max_keys: int = 10000):
+        self.window = window
+        self.max_keys = max_keys
+        self._calls: Dict[Hashable, Tuple[Future, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                future, expires_at = call
+                if expires_at is None or now < expires_at:
+                    leader = False
+                else:
+                    call = None
+            if call is None:
+                future = Future()
+                self._calls[key] = (future, None)
+                leader = True
+                if len(self._calls) > self.max_keys:
+                    self._prune(now)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._finish(key, future, shared=False)
+            future.set_exception(exc)
+            raise
+        self._finish(key, future, shared=True)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key: Hashable, future: Future, shared: bool) -> None:
+        with self._lock:
+            if self._calls.get(key, (None,))[0] is not future:
+                # Forgotten while running
+                return
+            if shared and self.window > 0:
+                self._calls[key] = (future, time.monotonic() + self.window)
+            else:
+                del self._calls[key]
+
+    def _prune(self, now: float) -> None:
+        self._calls = {
+            key: call
+            for key, call in self._calls.items()
+            if call[1] is None or now < call[1]
+        }
+
+    def forget(self, key: Optional[Hashable] = None) -> None:
+        """Stop sharing results for `key` (or every key) with later callers.
+
+        Calls already in flight still complete for the callers waiting on them.
+        """
+        with self._lock:
+            if key is None:
+                self._calls.clear()
+            else:
+                self._calls.pop(key, None)
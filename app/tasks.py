@@ -0,0 +1,310 @@
+import asyncio
+import inspect
+import json
+import logging
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Collection, Dict, List, Optional
+
+from sqlalchemy import delete, event, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Any]
+
+
+@dataclass
+class Job:
+    """One event waiting to be handled."""
+
+    event: str
+    payload: dict
+    attempts: int = 0
+    outbox_id: Optional[int] = None
+    outbox_row: Optional[OutboxEvent] = None
+
+
+class TaskQueue:
+    """In-process background jobs: a bounded asyncio queue and worker tasks.
+
+    Delivery is at-least-once (failed jobs are retried with exponential
+    backoff, and outbox rows are replayed after a crash), so handlers must be
+    idempotent. `submit` is thread-safe and may be called from the sync
+    endpoints running in the threadpool.
+
+    Outbox rows are claimed by the process handling them; the poller only
+    replays rows nobody has claimed for `outbox_claim_timeout` seconds, and
+    deletes rows processed more than `outbox_retention` seconds ago.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        maxsize: int = 10000,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        session_factory: Optional[Callable[[], Session]] = None,
+        outbox_poll_interval: float = 5.0,
+        outbox_claim_timeout: float = 300.0,
+        outbox_retention: float = 7 * 86400,
+    ):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.session_factory = session_factory
+        self.outbox_poll_interval = outbox_poll_interval
+        self.outbox_claim_timeout = outbox_claim_timeout
+        self.outbox_retention = outbox_retention
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._outbox_inflight = set()
+
+    def register(self, event_name: str) -> Callable[[Handler], Handler]:
+        """Decorator registering a sync or async handler for an event."""
+
+        def decorator(handler: Handler) -> Handler:
+            self.handlers[event_name].append(handler)
+            return handler
+
+        return decorator
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    async def start(self) -> None:
+        """Start the workers (and the outbox poller) on the running loop."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.session_factory is not None:
+            self._tasks.append(asyncio.create_task(self._poll_outbox()))
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Drain queued jobs for up to `timeout` seconds, then stop the workers."""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Stopping task queue with %d jobs pending", self._queue.qsize()
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+        self._outbox_inflight.clear()
+
+    def submit(self, job: Job) -> bool:
+        """Queue a job from any thread. Returns False when not running."""
+        loop = self._loop
+        if loop is None:
+            return False
+        if job.outbox_id is not None:
+            self._outbox_inflight.add(job.outbox_id)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            self._put(job)
+        else:
+            loop.call_soon_threadsafe(self._put, job)
+        return True
+
+    def _put(self, job: Job) -> None:
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # Outbox-backed jobs are picked up again by the poller
+            self._outbox_inflight.discard(job.outbox_id)
+            logger.warning("Task queue full, dropping %s event", job.event)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception:
+                # Never let one job take a worker down with it
+                logger.exception("Task worker failed on %s event", job.event)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        try:
+            for handler in self.handlers.get(job.event, ()):
+                if inspect.iscoroutinefunction(handler):
+                    await handler(job.payload)
+                else:
+                    await asyncio.to_thread(handler, job.payload)
+        except Exception:
+            job.attempts += 1
+            if job.attempts > self.max_retries:
+                logger.exception(
+                    "Giving up on %s event after %d attempts", job.event, job.attempts
+                )
+                await self._finish_outbox(job, failed=True)
+                return
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            self._loop.call_later(delay * random.uniform(0.5, 1.5), self._put, job)
+            return
+        await self._finish_outbox(job)
+
+    async def _finish_outbox(self, job: Job, failed: bool = False) -> None:
+        if job.outbox_id is None or self.session_factory is None:
+            return
+        values = (
+            {"attempts": job.attempts}
+            if failed
+            else {"processed_at": datetime.now(timezone.utc)}
+        )
+        try:
+            await asyncio.to_thread(self._update_outbox, job.outbox_id, values)
+        except Exception:
+            # The row is replayed once its claim expires
+            logger.exception("Could not update task outbox row %d", job.outbox_id)
+        finally:
+            self._outbox_inflight.discard(job.outbox_id)
+
+    def _update_outbox(self, outbox_id: int, values: dict) -> None:
+        with self.session_factory() as db:
+            db.query(OutboxEvent).filter(OutboxEvent.id == outbox_id).update(
+                values, synchronize_session=False
+            )
+            db.commit()
+
+    def _claim_outbox(self, skip: Collection[int]) -> List[Job]:
+        """Claim unprocessed outbox rows that no process is working on.
+
+        The conditional UPDATE makes each row go to one process only, even
+        with several workers polling at once.
+        """
+        now = datetime.now(timezone.utc)
+        claimable = (
+            OutboxEvent.processed_at.is_(None),
+            OutboxEvent.attempts <= self.max_retries,
+            or_(
+                OutboxEvent.claimed_at.is_(None),
+                OutboxEvent.claimed_at
+                < now - timedelta(seconds=self.outbox_claim_timeout),
+            ),
+        )
+        candidates = (
+            select(OutboxEvent.id)
+            .where(*claimable, OutboxEvent.id.not_in(skip))
+            .order_by(OutboxEvent.id)
+            .limit(100)
+            .with_for_update(skip_locked=True)
+        )
+        with self.session_factory() as db:
+            rows = db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(candidates.scalar_subquery()), *claimable)
+                .values(claimed_at=now)
+                .returning(
+                    OutboxEvent.id,
+                    OutboxEvent.event,
+                    OutboxEvent.payload,
+                    OutboxEvent.attempts,
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+        return [
+            Job(row.event, json.loads(row.payload), row.attempts, row.id)
+            for row in sorted(rows)
+        ]
+
+    def _purge_outbox(self) -> int:
+        """Delete rows processed longer than `outbox_retention` ago."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.outbox_retention)
+        with self.session_factory() as db:
+            result = db.execute(
+                delete(OutboxEvent).where(OutboxEvent.processed_at < cutoff)
+            )
+            db.commit()
+        return result.rowcount
+
+    async def _poll_outbox(self) -> None:
+        while True:
+            await asyncio.sleep(self.outbox_poll_interval)
+            try:
+                jobs = await asyncio.to_thread(
+                    self._claim_outbox, set(self._outbox_inflight)
+                )
+                await asyncio.to_thread(self._purge_outbox)
+            except Exception:
+                logger.exception("Could not poll the task outbox")
+                continue
+            for job in jobs:
+                self.submit(job)
+
+
+def emit(db: Session, event_name: str, payload: dict) -> None:
+    """Queue an event to be handled once `db`'s transaction commits.
+
+    With the outbox enabled the event is also written to `outbox_events` in
+    the same transaction, so it survives a crash before it is handled.
+    """
+    if not db.in_transaction():
+        # Make sure a rollback of this unit of work discards the event
+        db.begin()
+    job = Job(event_name, payload)
+    if settings.task_outbox_enabled:
+        job.outbox_row = OutboxEvent(
+            event=event_name,
+            payload=json.dumps(payload),
+            # Claimed for this process, which handles it right after commit
+            claimed_at=datetime.now(timezone.utc) if task_queue.running else None,
+        )
+        db.add(job.outbox_row)
+    db.info.setdefault("pending_jobs", []).append(job)
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_outbox_ids(session, flush_context):
+    for job in session.info.get("pending_jobs", ()):
+        if job.outbox_row is not None and job.outbox_id is None:
+            job.outbox_id = job.outbox_row.id
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending_jobs(session):
+    for job in session.info.pop("pending_jobs", ()):
+        job.outbox_row = None
+        task_queue.submit(job)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_jobs(session, previous_transaction):
+    # Savepoint rollbacks leave the outer transaction (and its events) alive
+    if not session.in_transaction():
+        session.info.pop("pending_jobs", None)
+
+
+task_queue = TaskQueue(
+    workers=settings.task_workers,
+    maxsize=settings.task_queue_size,
+    max_retries=settings.task_max_retries,
+    retry_backoff=settings.task_retry_backoff,
+    session_factory=SessionLocal if settings.task_outbox_enabled else None,
+    outbox_poll_interval=settings.task_outbox_poll_interval,
+    outbox_claim_timeout=settings.task_outbox_claim_timeout,
+    outbox_retention=settings.task_outbox_retention_days * 86400,
+)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud import add_post_views
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Per-worker buffer of post views, written behind in batches.
+
+    Reads only touch an in-memory counter; `flush` adds everything buffered
+    since the last flush in one statement. A crash loses at most one flush
+    interval of views from this worker.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        flush_interval: float = 5.0,
+        max_pending: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        self._full = threading.Event()
+
+    def record(self, post_id: int) -> None:
+        """Count one view; thread-safe and never touches the database."""
+        with self._lock:
+            self._pending[post_id] += 1
+            if len(self._pending) >= self.max_pending:
+                self._full.set()
+
+    def pending(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self) -> int:
+        """Write buffered views to the database; returns the posts updated."""
+        with self._lock:
+            counts, self._pending = self._pending, Counter()
+            self._full.clear()
+        if not counts:
+            return 0
+        try:
+            with self.session_factory() as db:
+                add_post_views(db, counts)
+        except Exception:
+            # Keep the views for the next attempt
+            with self._lock:
+                self._pending.update(counts)
+            raise
+        return len(counts)
+
+    async def run(self, tick: float = 0.25) -> None:
+        """Flush every `flush_interval` seconds, or sooner when the buffer fills."""
+        loop = asyncio.get_running_loop()
+        while True:
+            deadline = loop.time() + self.flush_interval
+            while loop.time() < deadline and not self._full.is_set():
+                await asyncio.sleep(tick)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                logger.exception("Could not flush post view counts")
+
+
+view_counter = ViewCounter(
+    SessionLocal,
+    flush_interval=settings.view_count_flush_interval,
+    max_pending=settings.view_count_max_pending,
+)
+
+
+@asynccontextmanager
+async def view_counter_lifespan() -> AsyncIterator[None]:
+    """Flush view counts periodically, and once more on shutdown."""
+    if not settings.view_counts_enabled:
+        yield
+        return
+    flusher = asyncio.create_task(view_counter.run())
+    try:
+        yield
+    finally:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        try:
+            await asyncio.to_thread(view_counter.flush)
+        except Exception:
+            logger.exception("Lost buffered post view counts on shutdown")
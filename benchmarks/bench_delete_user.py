@@ -0,0 +1,65 @@
+"""Delete a user with many posts and count the statements it takes.
+
+    python -m benchmarks.bench_delete_user [--posts 100000] [--url sqlite://]
+
+Defaults to an in-memory SQLite database; pass a PostgreSQL URL to measure
+against the real thing (the tables are created and dropped).
+"""
+
+import argparse
+import time
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import delete_user
+from app.models import Base, Post, User
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--url", default="sqlite://")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        db.execute(
+            insert(Post),
+            [
+                {"title": f"Post {i}", "content": "x" * 200, "author_id": user_id}
+                for i in range(args.posts)
+            ],
+        )
+        db.commit()
+
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *a: statements.append(statement),
+    )
+    with Session() as db:
+        start = time.perf_counter()
+        assert delete_user(db, user_id)
+        elapsed = time.perf_counter() - start
+        remaining = db.query(Post).count()
+
+    print(f"posts:      {args.posts}")
+    print(f"statements: {len(statements) - 1}")  # minus the verification COUNT
+    for statement in statements[:-1]:
+        print(f"  {' '.join(statement.split())}")
+    print(f"elapsed:    {elapsed * 1000:.1f} ms")
+    print(f"remaining:  {remaining}")
+    Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Measure post read throughput with view counting off, buffered or direct.
+
+    python -m benchmarks.bench_post_views [--reads 20000] [--threads 8] [--url URL]
+
+Each read loads a post the way GET /posts/{id} does. `buffered` counts the
+view in the write-behind ViewCounter (flushed every --flush-interval
+seconds by a background thread); `direct` runs an UPDATE and COMMIT per
+read, the approach the counter replaces. Defaults to a temporary SQLite
+file; pass a PostgreSQL URL to measure against the real thing (the tables
+are created and dropped).
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import get_post
+from app.models import Base, Post, User
+from app.views import ViewCounter
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--url")
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.url
+    if url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    engine = create_engine(url, pool_size=args.threads, max_overflow=0)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.commit()
+        db.execute(
+            insert(Post),
+            [
+                {"title": f"Post {i}", "content": "x" * 2000, "author_id": user.id}
+                for i in range(args.posts)
+            ],
+        )
+        db.commit()
+        post_ids = db.scalars(select(Post.id)).all()
+    # Skewed towards a few hot posts, like a post going viral
+    targets = random.choices(
+        post_ids,
+        weights=[1 / (rank + 1) for rank in range(len(post_ids))],
+        k=args.reads,
+    )
+
+    for mode in ("off", "buffered", "direct"):
+        counter = ViewCounter(Session, flush_interval=args.flush_interval)
+        stop = threading.Event()
+
+        def flusher():
+            while not stop.wait(args.flush_interval):
+                counter.flush()
+
+        def read(post_id):
+            with Session() as db:
+                post = get_post(db, post_id)
+                if mode == "direct":
+                    db.execute(
+                        update(Post)
+                        .where(Post.id == post_id)
+                        .values(view_count=Post.view_count + 1)
+                    )
+                    db.commit()
+                elif mode == "buffered":
+                    counter.record(post_id)
+                return post.title
+
+        flush_thread = threading.Thread(target=flusher)
+        if mode == "buffered":
+            flush_thread.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            for post_id in targets:
+                pool.submit(read, post_id)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        if mode == "buffered":
+            flush_thread.join()
+            counter.flush()
+
+        with Session() as db:
+            counted = sum(db.scalars(select(Post.view_count)).all())
+            db.execute(update(Post).values(view_count=0))
+            db.commit()
+        print(
+            f"{mode:>9}: {args.reads / elapsed:8.0f} reads/s"
+            f"  ({elapsed:.2f} s, {counted} views stored)"
+        )
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Per-call overhead of the hot crud reads: per-call queries vs cached statements.
+
+    python -m benchmarks.bench_statement_cache [--calls 5000] [--url sqlite://]
+
+"before" rebuilds a legacy `db.query(...).filter(...)` on every call, as
+crud did; "after" calls the crud functions, which execute statements built
+once at import. Each legacy query loads exactly what its crud counterpart
+does, and both run against the same small table, so the difference is
+mostly Python-side statement construction and cache-key work.
+"""
+
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import joinedload, sessionmaker, undefer
+
+from app import crud
+from app.models import Base, Post, User
+
+
+def legacy_get_post(db, post_id):
+    return (
+        db.query(Post)
+        .options(undefer(Post.content), joinedload(Post.tag_links))
+        .filter(Post.id == post_id)
+        .first()
+    )
+
+
+def legacy_get_user_by_username(db, username):
+    return db.query(User).filter(User.username == username).first()
+
+
+def legacy_get_posts(db, skip=0, limit=100):
+    return db.query(Post).offset(skip).limit(limit).all()
+
+
+def legacy_get_user_posts(db, user_id, skip=0, limit=100):
+    return (
+        db.query(Post).filter(Post.author_id == user_id).offset(skip).limit(limit).all()
+    )
+
+
+def per_call_us(fn, calls: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--url", default="sqlite://")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add_all(
+            Post(title=f"Post {i}", content="x" * 200, author_id=user.id)
+            for i in range(10)
+        )
+        db.commit()
+        user_id = user.id
+        post_id = db.query(Post.id).limit(1).scalar()
+
+        cases = [
+            (
+                "get_post",
+                lambda: legacy_get_post(db, post_id),
+                lambda: crud.get_post(db, post_id),
+            ),
+            (
+                "get_user_by_username",
+                lambda: legacy_get_user_by_username(db, "bench"),
+                lambda: crud.get_user_by_username(db, "bench"),
+            ),
+            (
+                "get_posts",
+                lambda: legacy_get_posts(db, limit=10),
+                lambda: crud.get_posts(db, limit=10),
+            ),
+            (
+                "get_user_posts",
+                lambda: legacy_get_user_posts(db, user_id, limit=10),
+                lambda: crud.get_user_posts(db, user_id, limit=10),
+            ),
+        ]
+        print(f"{'':<22}{'before':>10}{'after':>10}  (us per call)")
+        for name, before, after in cases:
+            print(
+                f"{name:<22}{per_call_us(before, args.calls):>10.1f}"
+                f"{per_call_us(after, args.calls):>10.1f}"
+            )
+
+    Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
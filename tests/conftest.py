@@ -1,13 +1,20 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.auth import get_password_hash
+from app.config import settings
 from app.database import Base, get_db
+from app.idempotency import get_store as get_idempotency_store
 from app.main import app
 from app.models import User
+from app.rate_limit import get_store
+from app.routers.posts import reads as post_reads
+from app.views import view_counter
 
 # Create in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -31,6 +38,48 @@ def override_get_db():
 
 # Override the database dependency
 app.dependency_overrides[get_db] = override_get_db
+view_counter.session_factory = TestingSessionLocal
+
+
+class SQLStatements(list):
+    """SQL sent to the test database inside `with` blocks, in order."""
+
+    def _record(self, conn, cursor, statement, *args):
+        self.append(statement)
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(engine, "before_cursor_execute", self._record)
+
+
+@pytest.fixture
+def sql_statements():
+    """Record the statements a block runs: `with sql_statements: ...`."""
+    return SQLStatements()
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Start every test with full rate limit buckets."""
+    get_store().reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_idempotency_keys():
+    """Start every test without remembered Idempotency-Key responses."""
+    get_idempotency_store().reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_read_coalescing():
+    """Never share a read result between tests."""
+    post_reads.forget()
+    yield
 
 
 @pytest.fixture
@@ -59,6 +108,33 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def pg_session():
+    """A session on fresh tables in DATABASE_URL, when that is PostgreSQL.
+
+    For the code paths only PostgreSQL takes (COPY, partitioning); skipped
+    unless DATABASE_URL names a reachable PostgreSQL database, as in CI.
+    """
+    if make_url(settings.database_url).get_backend_name() != "postgresql":
+        pytest.skip("DATABASE_URL is not PostgreSQL")
+    pg_engine = create_engine(settings.database_url)
+    try:
+        pg_engine.connect().close()
+    except OperationalError:
+        pg_engine.dispose()
+        pytest.skip("PostgreSQL at DATABASE_URL is not reachable")
+    Base.metadata.drop_all(bind=pg_engine)
+    Base.metadata.create_all(bind=pg_engine)
+
+    session = sessionmaker(autocommit=False, autoflush=False, bind=pg_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=pg_engine)
+        pg_engine.dispose()
+
+
 @pytest.fixture
 def test_user(db_session):
     """Create a test user."""
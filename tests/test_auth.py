@@ -1,5 +1,20 @@
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from fastapi import status
+from sqlalchemy import func
+
+from app.auth import (
+    calibrate_bcrypt_rounds,
+    configure_password_hashing,
+    create_refresh_token,
+    pwd_context,
+    rotate_refresh_token,
+)
+from app.cli import main as cli_main
+from app.config import settings
+from app.models import RefreshToken
+from tests.conftest import TestingSessionLocal
 
 
 class TestAuth:
@@ -22,6 +37,22 @@ class TestAuth:
         assert "id" in data
         assert "hashed_password" not in data
 
+    def test_signup_single_statement(self, client, sql_statements):
+        """Test that signup issues one INSERT ... RETURNING and no lookups."""
+        user_data = {
+            "email": "fast@example.com",
+            "username": "fast",
+            "password": "password123",
+        }
+        with sql_statements:
+            response = client.post("/api/v1/auth/signup", json=user_data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["post_count"] == 0
+        assert len(sql_statements) == 1
+        assert sql_statements[0].startswith("INSERT INTO users")
+        assert "RETURNING" in sql_statements[0]
+
     def test_signup_duplicate_email(self, client, test_user):
         """Test signup with duplicate email."""
         user_data = {
@@ -59,6 +90,131 @@ class TestAuth:
         assert "access_token" in data
         assert data["token_type"] == "bearer"
 
+    def test_refresh_rotates_token(self, client, test_user):
+        """Test exchanging a refresh token for new tokens."""
+        login_response = client.post(
+            "/api/v1/auth/login",
+            data={"username": "testuser", "password": "testpassword"},
+        )
+        refresh_token = login_response.json()["refresh_token"]
+
+        response = client.post(
+            "/api/v1/auth/refresh", json={"refresh_token": refresh_token}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["refresh_token"] != refresh_token
+        me = client.get(
+            "/api/v1/auth/me",
+            headers={"Authorization": f"Bearer {data['access_token']}"},
+        )
+        assert me.json()["username"] == "testuser"
+
+    def test_refresh_reuse_revokes_family(self, client, test_user):
+        """Test that replaying a rotated refresh token revokes its successors."""
+        login_response = client.post(
+            "/api/v1/auth/login",
+            data={"username": "testuser", "password": "testpassword"},
+        )
+        first = login_response.json()["refresh_token"]
+        second = client.post(
+            "/api/v1/auth/refresh", json={"refresh_token": first}
+        ).json()["refresh_token"]
+
+        reuse = client.post("/api/v1/auth/refresh", json={"refresh_token": first})
+        assert reuse.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = client.post("/api/v1/auth/refresh", json={"refresh_token": second})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_concurrent_refresh_counts_as_reuse(self, db_session, test_user):
+        """Test that only one of two refreshes racing on a token succeeds."""
+        token = create_refresh_token(db_session, test_user.id)
+        # This session read the token before the other refresh revoked it
+        db_session.query(RefreshToken).one()
+
+        with TestingSessionLocal() as other:
+            assert rotate_refresh_token(other, token) is not None
+
+        assert rotate_refresh_token(db_session, token) is None
+        db_session.expire_all()
+        assert all(t.revoked_at for t in db_session.query(RefreshToken).all())
+
+    def test_purge_refresh_tokens(self, db_session, test_user, monkeypatch, capsys):
+        """Test that only logins with every token expired are deleted."""
+        dead = create_refresh_token(db_session, test_user.id)
+        rotate_refresh_token(db_session, dead)
+        rotated = create_refresh_token(db_session, test_user.id)
+        live = rotate_refresh_token(db_session, rotated)[1]
+        # Expire every token but the one just issued
+        newest = db_session.query(func.max(RefreshToken.id)).scalar()
+        db_session.query(RefreshToken).filter(RefreshToken.id != newest).update(
+            {"expires_at": datetime.now(timezone.utc) - timedelta(days=1)}
+        )
+        db_session.commit()
+        monkeypatch.setattr("app.cli.SessionLocal", TestingSessionLocal)
+
+        cli_main(["purge-refresh-tokens"])
+
+        assert "Deleted 2 expired refresh tokens" in capsys.readouterr().out
+        # The rotated token stays while its successor lives, to detect reuse
+        assert db_session.query(RefreshToken).count() == 2
+        assert rotate_refresh_token(db_session, rotated) is None
+        assert rotate_refresh_token(db_session, live) is None
+
+    def test_logout_revokes_refresh_token(self, client, test_user):
+        """Test that a logged out refresh token can no longer be used."""
+        login_response = client.post(
+            "/api/v1/auth/login",
+            data={"username": "testuser", "password": "testpassword"},
+        )
+        refresh_token = login_response.json()["refresh_token"]
+
+        response = client.post(
+            "/api/v1/auth/logout", json={"refresh_token": refresh_token}
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        response = client.post(
+            "/api/v1/auth/refresh", json={"refresh_token": refresh_token}
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_refresh_invalid_token(self, client):
+        """Test refreshing with an unknown token."""
+        response = client.post("/api/v1/auth/refresh", json={"refresh_token": "nope"})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert "Invalid refresh token" in response.json()["detail"]
+
+    def test_login_rehashes_outdated_hash(self, client, test_user, db_session):
+        """Test that login transparently rehashes with the configured cost."""
+        original_rounds = settings.bcrypt_rounds
+        settings.bcrypt_rounds = 5
+        try:
+            configure_password_hashing()
+            assert pwd_context.needs_update(test_user.hashed_password)
+
+            login_data = {"username": "testuser", "password": "testpassword"}
+            response = client.post("/api/v1/auth/login", data=login_data)
+
+            assert response.status_code == status.HTTP_200_OK
+            db_session.refresh(test_user)
+            assert test_user.hashed_password.startswith("$2b$05$")
+            assert not pwd_context.needs_update(test_user.hashed_password)
+
+            response = client.post("/api/v1/auth/login", data=login_data)
+            assert response.status_code == status.HTTP_200_OK
+        finally:
+            settings.bcrypt_rounds = original_rounds
+            configure_password_hashing()
+
+    def test_calibrate_bcrypt_rounds_clamps(self):
+        """Test that the calibrated cost stays inside the configured bounds."""
+        assert calibrate_bcrypt_rounds(0.001, min_rounds=6, max_rounds=8) == 6
+        assert calibrate_bcrypt_rounds(10**9, min_rounds=6, max_rounds=8) == 8
+
     def test_login_invalid_username(self, client):
         """Test login with invalid username."""
         login_data = {"username": "nonexistentuser", "password": "testpassword"}
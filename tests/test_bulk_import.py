@@ -0,0 +1,164 @@
+import json
+
+import pytest
+
+from app.auth import get_password_hash, pwd_context, verify_password
+from app.bulk_import import ImportRowError, import_posts, import_users
+from app.cli import main as cli_main
+from app.models import FeedEntry, Post, User
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def cli_session(db_session, monkeypatch):
+    """Point the CLI at the test database."""
+    monkeypatch.setattr("app.cli.SessionLocal", TestingSessionLocal)
+    hashing = pwd_context.to_dict()
+    yield db_session
+    # Imports may lower the bcrypt cost; restore it for other tests
+    pwd_context.load(hashing)
+
+
+class TestBulkImport:
+    """Test `python -m app.cli import`."""
+
+    def test_import_users_csv(self, cli_session, tmp_path, capsys):
+        """Test loading pre-hashed and plain-password users from CSV."""
+        path = tmp_path / "users.csv"
+        path.write_text(
+            "email,username,password,hashed_password\n"
+            f"a@example.com,alice,,{get_password_hash('alicepass')}\n"
+            "b@example.com,bob,bobpass,\n"
+        )
+
+        cli_main(
+            [
+                "import",
+                "users",
+                str(path),
+                "--hash-workers",
+                "2",
+                "--bcrypt-rounds",
+                "4",
+            ]
+        )
+
+        users = {user.username: user for user in cli_session.query(User)}
+        assert verify_password("alicepass", users["alice"].hashed_password)
+        assert verify_password("bobpass", users["bob"].hashed_password)
+        assert users["bob"].hashed_password.startswith("$2b$04$")
+        assert users["bob"].is_active
+        assert "Imported 2 users in" in capsys.readouterr().out
+
+    def test_import_posts_ndjson(self, cli_session, test_user, tmp_path, capsys):
+        """Test loading posts in batches and rebuilding derived data."""
+        path = tmp_path / "posts.ndjson"
+        rows = [
+            {
+                "title": f"Post {i}",
+                "content": f"Body {i}.",
+                "published": i % 2 == 0,
+                "author_username": "testuser",
+            }
+            for i in range(5)
+        ]
+        path.write_text("\n".join(json.dumps(row) for row in rows))
+
+        cli_main(["import", "posts", str(path), "--batch-size", "2"])
+
+        assert cli_session.query(Post).count() == 5
+        assert cli_session.query(FeedEntry).count() == 3
+        user = cli_session.get(User, test_user.id, populate_existing=True)
+        assert user.post_count == 5
+        assert user.published_count == 3
+        post = cli_session.query(Post).filter_by(title="Post 4").one()
+        assert post.content == "Body 4."
+        assert post.excerpt == "Body 4."
+        assert "Imported 5 posts in" in capsys.readouterr().out
+
+    def test_import_adds_only_new_posts_to_feed(self, cli_session, test_user):
+        """Test that existing feed rows are left alone by an import."""
+        post = Post(title="Old", content="Old.", published=True, author=test_user)
+        cli_session.add(post)
+        cli_session.flush()
+        # A rebuild would replace this title with the post's
+        cli_session.add(
+            FeedEntry(
+                post_id=post.id,
+                title="Kept",
+                author_id=test_user.id,
+                author_username="testuser",
+            )
+        )
+        cli_session.commit()
+        rows = [{"title": "New", "content": "Body.", "published": True}]
+
+        import_posts(cli_session, [{**row, "author_id": test_user.id} for row in rows])
+
+        titles = {entry.title for entry in cli_session.query(FeedEntry)}
+        assert titles == {"Kept", "New"}
+
+    def test_copy_round_trip(self, pg_session):
+        """Test the PostgreSQL COPY path against a real server."""
+        import_users(
+            pg_session,
+            [
+                {
+                    "email": "c@example.com",
+                    "username": "carol",
+                    "hashed_password": get_password_hash("carolpass"),
+                    "is_active": "false",
+                }
+            ],
+        )
+        content = 'Line one,\n"quoted" and \\ backslash, ' + "long " * 500
+        import_posts(
+            pg_session,
+            [
+                {"title": "A, b", "content": content, "author_username": "carol"},
+                {
+                    "title": "Live",
+                    "content": "Short.",
+                    "published": "true",
+                    "author_username": "carol",
+                },
+            ],
+            batch_size=1,
+        )
+
+        user = pg_session.query(User).filter_by(username="carol").one()
+        assert not user.is_active
+        assert verify_password("carolpass", user.hashed_password)
+        assert user.post_count == 2
+        assert user.published_count == 1
+        post = pg_session.query(Post).filter_by(title="A, b").one()
+        assert post.content == content
+        assert [entry.title for entry in pg_session.query(FeedEntry)] == ["Live"]
+
+    def test_failed_import_keeps_earlier_batches_consistent(
+        self, cli_session, test_user
+    ):
+        """Test that posts committed before a bad row are counted and in the feed."""
+        rows = [
+            {"title": "One", "content": "Body.", "published": True},
+            {"title": "Two", "content": "Body."},
+            {"title": "Bad", "content": "Body.", "author_username": "nobody"},
+        ]
+        rows[0]["author_id"] = rows[1]["author_id"] = test_user.id
+
+        with pytest.raises(ImportRowError):
+            import_posts(cli_session, rows, batch_size=2)
+
+        assert cli_session.query(Post).count() == 2
+        user = cli_session.get(User, test_user.id, populate_existing=True)
+        assert user.post_count == 2
+        assert user.published_count == 1
+        assert [entry.title for entry in cli_session.query(FeedEntry)] == ["One"]
+
+    def test_import_posts_unknown_author(self, cli_session, tmp_path):
+        """Test that a post without a known author stops the import."""
+        path = tmp_path / "posts.csv"
+        path.write_text("title,content,author_username\nHi,Body,nobody\n")
+
+        with pytest.raises(ImportRowError):
+            cli_main(["import", "posts", str(path)])
@@ -0,0 +1,126 @@
+from fastapi import status
+
+from app.idempotency import (
+    InMemoryIdempotencyStore,
+    SQLIdempotencyStore,
+    StoredResponse,
+)
+from app.models import Post
+from tests.conftest import TestingSessionLocal
+
+
+class TestIdempotencyStores:
+    """Test the idempotency response stores."""
+
+    def test_lru_evicts_oldest(self):
+        """Test that the in-memory store keeps only the most recent entries."""
+        store = InMemoryIdempotencyStore(max_entries=2)
+        for key in ("a", "b", "c"):
+            store.put(key, StoredResponse("f", 201, [], key.encode()))
+
+        assert store.get("a") is None
+        assert store.get("c").body == b"c"
+
+    def test_sql_store_round_trip(self, db_session):
+        """Test that responses survive in the table when the cache is cold."""
+        response = StoredResponse(
+            "fingerprint", 201, [(b"content-type", b"application/json")], b"{}"
+        )
+        SQLIdempotencyStore(TestingSessionLocal, InMemoryIdempotencyStore()).put(
+            "key", response
+        )
+
+        store = SQLIdempotencyStore(TestingSessionLocal, InMemoryIdempotencyStore())
+
+        assert store.get("key") == response
+        assert store.get("other") is None
+
+    def test_sql_store_put_over_existing_key(self, db_session):
+        """Test that a second writer of a key upserts instead of failing."""
+        first = SQLIdempotencyStore(TestingSessionLocal, InMemoryIdempotencyStore())
+        second = SQLIdempotencyStore(TestingSessionLocal, InMemoryIdempotencyStore())
+
+        first.put("key", StoredResponse("fingerprint", 201, [], b"first"))
+        second.put("key", StoredResponse("fingerprint", 201, [], b"second"))
+
+        fresh = SQLIdempotencyStore(TestingSessionLocal, InMemoryIdempotencyStore())
+        assert fresh.get("key").body == b"second"
+
+
+class TestIdempotentEndpoints:
+    """Test Idempotency-Key handling on the create endpoints."""
+
+    def test_retried_post_is_created_once(self, client, auth_headers, db_session):
+        """Test that a retry replays the first response instead of creating."""
+        headers = {**auth_headers, "Idempotency-Key": "retry-1"}
+        post_data = {"title": "Once", "content": "Only once."}
+
+        first = client.post("/api/v1/posts/", json=post_data, headers=headers)
+        second = client.post("/api/v1/posts/", json=post_data, headers=headers)
+
+        assert first.status_code == second.status_code == status.HTTP_201_CREATED
+        assert second.json() == first.json()
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in first.headers
+        assert db_session.query(Post).count() == 1
+
+    def test_key_reused_with_different_body(self, client, auth_headers):
+        """Test that reusing a key for another request is rejected."""
+        headers = {**auth_headers, "Idempotency-Key": "retry-2"}
+        client.post(
+            "/api/v1/posts/", json={"title": "A", "content": "A."}, headers=headers
+        )
+
+        response = client.post(
+            "/api/v1/posts/", json={"title": "B", "content": "B."}, headers=headers
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_keys_are_scoped_to_the_caller(
+        self, client, auth_headers, test_user2, db_session
+    ):
+        """Test that two users sending the same key both get their post."""
+        login = client.post(
+            "/api/v1/auth/login",
+            data={"username": "testuser2", "password": "testpassword2"},
+        )
+        other_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        post_data = {"title": "Same", "content": "Same."}
+
+        for headers in (auth_headers, other_headers):
+            response = client.post(
+                "/api/v1/posts/",
+                json=post_data,
+                headers={**headers, "Idempotency-Key": "shared"},
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+
+        assert db_session.query(Post).count() == 2
+
+    def test_retried_signup_replays_created_user(self, client, monkeypatch):
+        """Test that a retried signup neither hashes again nor reports a duplicate."""
+        user_data = {
+            "email": "retry@example.com",
+            "username": "retry",
+            "password": "password123",
+        }
+        headers = {"Idempotency-Key": "signup-1"}
+        first = client.post("/api/v1/auth/signup", json=user_data, headers=headers)
+
+        def fail(password):
+            raise AssertionError("signup ran again")
+
+        monkeypatch.setattr("app.crud.get_password_hash", fail)
+        second = client.post("/api/v1/auth/signup", json=user_data, headers=headers)
+
+        assert first.status_code == second.status_code == status.HTTP_201_CREATED
+        assert second.json()["id"] == first.json()["id"]
+
+    def test_requests_without_key_are_untouched(self, client, auth_headers):
+        """Test that plain retries still create separate posts."""
+        post_data = {"title": "Twice", "content": "Twice."}
+        first = client.post("/api/v1/posts/", json=post_data, headers=auth_headers)
+        second = client.post("/api/v1/posts/", json=post_data, headers=auth_headers)
+
+        assert first.json()["id"] != second.json()["id"]
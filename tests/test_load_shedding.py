@@ -0,0 +1,120 @@
+import asyncio
+
+from fastapi import status
+
+from app.auth import create_access_token
+from app.load_shedding import (
+    ANONYMOUS_READ,
+    CRITICAL,
+    READ,
+    AdaptiveLimiter,
+    LoadSheddingMiddleware,
+    classify,
+)
+
+
+def _scope(method="GET", path="/api/v1/posts/", headers=()):
+    return {"type": "http", "method": method, "path": path, "headers": list(headers)}
+
+
+class TestAdaptiveLimiter:
+    """Test the AIMD concurrency limit."""
+
+    def test_anonymous_reads_are_shed_first(self):
+        """Test that each priority only gets its share of the limit."""
+        limiter = AdaptiveLimiter(initial_limit=10, min_limit=1)
+        for _ in range(7):
+            assert limiter.try_acquire(ANONYMOUS_READ)
+
+        assert not limiter.try_acquire(ANONYMOUS_READ)
+        assert limiter.try_acquire(READ)
+        assert limiter.try_acquire(READ)
+        assert not limiter.try_acquire(READ)
+        assert limiter.try_acquire(CRITICAL)
+        assert not limiter.try_acquire(CRITICAL)
+        assert limiter.shed == 3
+        assert not limiter.ready
+
+    def test_slow_requests_shrink_the_limit(self):
+        """Test multiplicative decrease, once per latency target."""
+        limiter = AdaptiveLimiter(initial_limit=100, target_latency=60, backoff=0.5)
+        for _ in range(3):
+            limiter.try_acquire()
+            limiter.release(latency=120)
+
+        assert limiter.limit == 50
+
+    def test_fast_requests_grow_the_limit_in_use(self):
+        """Test additive increase only while the limit is being used."""
+        limiter = AdaptiveLimiter(initial_limit=4, target_latency=1)
+        limiter.try_acquire()
+        limiter.release(latency=0.01)
+        assert limiter.limit == 4
+
+        for _ in range(4):
+            limiter.try_acquire()
+        limiter.release(latency=0.01)
+
+        assert limiter.limit == 4.25
+
+    def test_single_shed_keeps_ready(self):
+        """Test that readiness only fails on a sustained shed rate."""
+        limiter = AdaptiveLimiter(initial_limit=10, min_limit=1, ready_shed_count=3)
+        for _ in range(8):
+            limiter.try_acquire(ANONYMOUS_READ)
+
+        assert not limiter.try_acquire(ANONYMOUS_READ)
+        assert limiter.ready
+        assert not limiter.try_acquire(ANONYMOUS_READ)
+        assert not limiter.try_acquire(ANONYMOUS_READ)
+        assert not limiter.ready
+
+    def test_classify(self):
+        """Test request priorities."""
+        token = create_access_token({"sub": "testuser"})
+        auth = b"authorization", f"Bearer {token}".encode()
+        assert classify(_scope(), "/api/v1/auth/") == ANONYMOUS_READ
+        assert classify(_scope(headers=[auth]), "/api/v1/auth/") == READ
+        for forged in (b"x", b"Bearer token", b"Basic dXNlcjpwYXNz"):
+            scope = _scope(headers=[(b"authorization", forged)])
+            assert classify(scope, "/api/v1/auth/") == ANONYMOUS_READ
+        assert classify(_scope(method="POST"), "/api/v1/auth/") == CRITICAL
+        me = _scope(method="GET", path="/api/v1/auth/me")
+        assert classify(me, "/api/v1/auth/") == CRITICAL
+
+
+class TestLoadSheddingMiddleware:
+    """Test shedding and readiness through the middleware."""
+
+    def test_sheds_with_fast_503(self):
+        """Test that requests beyond the limit never reach the app."""
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1)
+        limiter.try_acquire(CRITICAL)
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope)
+
+        middleware = LoadSheddingMiddleware(app, "/auth/", limiter=limiter)
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(middleware(_scope(), None, send))
+
+        assert calls == []
+        assert messages[0]["status"] == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert (b"retry-after", b"1") in messages[0]["headers"]
+
+    def test_health_reports_saturation(self, client, monkeypatch):
+        """Test that /health is a readiness probe."""
+        assert client.get("/health").status_code == status.HTTP_200_OK
+
+        saturated = AdaptiveLimiter(initial_limit=1, min_limit=1)
+        saturated.try_acquire()
+        monkeypatch.setattr("app.main.limiter", saturated)
+
+        response = client.get("/health")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.json()["status"] == "overloaded"
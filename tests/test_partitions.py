@@ -0,0 +1,186 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import func, select, text
+
+from app.cli import main as cli_main
+from app.crud import rebuild_feed
+from app.models import FeedEntry, Post, PostTag, User
+from app.partitions import (
+    add_months,
+    archive_partitions,
+    create_partitions,
+    is_partitioned,
+    partition_month,
+    partition_name,
+    partition_posts,
+    partitions_to_archive,
+    unpartition_posts,
+)
+from tests.conftest import TestingSessionLocal
+
+
+def _add_posts(db, *months):
+    """A user with one published, tagged post in each month of 2026."""
+    user = User(email="p@example.com", username="partitioned", hashed_password="x")
+    db.add(user)
+    db.flush()
+    for month in months:
+        post = Post(
+            title=f"Post {month}",
+            content="Body.",
+            published=True,
+            author_id=user.id,
+            created_at=datetime(2026, month, 15, tzinfo=timezone.utc),
+        )
+        db.add(post)
+        db.flush()
+        db.add(PostTag(tag="news", post_id=post.id))
+    db.commit()
+    rebuild_feed(db)
+    return user.id
+
+
+def _count(db, table):
+    return db.scalar(text(f"SELECT count(*) FROM {table}"))
+
+
+class TestPartitions:
+    """Test the monthly posts partition helpers and maintenance command."""
+
+    def test_add_months_crosses_years(self):
+        """Test month arithmetic in both directions."""
+        assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+        assert add_months(date(2026, 1, 15), -1) == date(2025, 12, 1)
+        assert add_months(date(2026, 5, 1), 0) == date(2026, 5, 1)
+
+    def test_partition_names_round_trip(self):
+        """Test that partition names map back to their month."""
+        assert partition_name(date(2026, 3, 1)) == "posts_p202603"
+        assert partition_month("posts_p202603") == date(2026, 3, 1)
+        assert partition_month("posts_default") is None
+        assert partition_month("posts_p2026") is None
+
+    def test_partitions_to_archive(self):
+        """Test that only whole months past the retention period expire."""
+        names = [
+            "posts_default",
+            "posts_p202512",
+            "posts_p202601",
+            "posts_p202604",
+            "posts_p202605",
+        ]
+
+        expired = partitions_to_archive(names, date(2026, 5, 20), retain_months=4)
+
+        assert expired == ["posts_p202512"]
+        assert partitions_to_archive(names, date(2026, 5, 20), 0) == [
+            "posts_p202512",
+            "posts_p202601",
+            "posts_p202604",
+        ]
+
+    def test_command_requires_partitioned_table(self, monkeypatch, capsys):
+        """Test that the command leaves an unpartitioned database alone."""
+        monkeypatch.setattr("app.cli.SessionLocal", TestingSessionLocal)
+
+        cli_main(["partitions", "--retention-months", "12"])
+
+        assert "not partitioned" in capsys.readouterr().out
+
+    def test_partition_command_requires_postgresql(self, monkeypatch, capsys):
+        """Test that converting is refused outside PostgreSQL."""
+        monkeypatch.setattr("app.cli.SessionLocal", TestingSessionLocal)
+
+        cli_main(["partition-posts"])
+
+        assert "requires PostgreSQL" in capsys.readouterr().out
+
+
+class TestPostgresPartitions:
+    """Test converting and maintaining partitions on a real server."""
+
+    def test_partition_posts_prunes_by_created_at(self, pg_session):
+        """Test the conversion, partition pruning and the delete triggers."""
+        _add_posts(pg_session, 1, 2)
+
+        created = partition_posts(pg_session, date(2026, 3, 10), months_ahead=1)
+
+        assert is_partitioned(pg_session)
+        assert created == [
+            "posts_p202601",
+            "posts_p202602",
+            "posts_p202603",
+            "posts_p202604",
+        ]
+        assert pg_session.scalar(select(func.count(Post.id))) == 2
+        plan = "\n".join(
+            pg_session.execute(
+                text(
+                    "EXPLAIN SELECT id FROM posts "
+                    "WHERE created_at >= '2026-02-01 00:00:00+00' "
+                    "AND created_at < '2026-03-01 00:00:00+00'"
+                )
+            ).scalars()
+        )
+        assert "posts_p202602" in plan
+        assert "posts_p202601" not in plan
+        assert "posts_default" not in plan
+
+        pg_session.execute(text("DELETE FROM posts WHERE title = 'Post 1'"))
+        pg_session.commit()
+        assert _count(pg_session, "published_feed") == 1
+        assert _count(pg_session, "post_tags") == 1
+
+    def test_create_partitions_moves_default_rows(self, pg_session):
+        """Test that a new month takes over its rows from the default."""
+        user_id = _add_posts(pg_session, 3)
+        partition_posts(pg_session, date(2026, 3, 10), months_ahead=0)
+        pg_session.add(
+            Post(
+                title="Early",
+                content="Body.",
+                author_id=user_id,
+                created_at=datetime(2026, 5, 20, tzinfo=timezone.utc),
+            )
+        )
+        pg_session.commit()
+        assert _count(pg_session, "posts_default") == 1
+
+        created = create_partitions(pg_session, date(2026, 5, 1), months_ahead=0)
+
+        assert created == ["posts_p202605"]
+        assert _count(pg_session, "posts_p202605") == 1
+        assert _count(pg_session, "posts_default") == 0
+        assert pg_session.scalar(select(func.count(Post.id))) == 2
+
+    def test_archive_partitions(self, pg_session):
+        """Test that archiving drops old months and their derived rows."""
+        user_id = _add_posts(pg_session, 1, 2, 4)
+        partition_posts(pg_session, date(2026, 4, 10), months_ahead=0)
+
+        archived = archive_partitions(
+            pg_session, date(2026, 5, 1), retain_months=2, drop=True
+        )
+
+        assert archived == ["posts_p202601", "posts_p202602"]
+        user = pg_session.get(User, user_id, populate_existing=True)
+        assert user.post_count == 1
+        assert [entry.title for entry in pg_session.query(FeedEntry)] == ["Post 4"]
+        assert _count(pg_session, "post_tags") == 1
+
+    def test_unpartition_posts(self, pg_session):
+        """Test converting back restores the plain table and foreign keys."""
+        _add_posts(pg_session, 1, 2)
+        partition_posts(pg_session, date(2026, 2, 10), months_ahead=0)
+
+        unpartition_posts(pg_session)
+
+        assert not is_partitioned(pg_session)
+        assert pg_session.scalar(select(func.count(Post.id))) == 2
+        keys = pg_session.scalars(
+            text(
+                "SELECT conname FROM pg_constraint "
+                "WHERE confrelid = 'posts'::regclass ORDER BY conname"
+            )
+        ).all()
+        assert keys == ["post_tags_post_id_fkey", "published_feed_post_id_fkey"]
@@ -1,5 +1,13 @@
 import pytest
 from fastapi import status
+from sqlalchemy import text
+
+from app.cli import main as cli_main
+from app.config import settings
+from app.crud import VersionConflictError, update_post
+from app.models import FeedEntry, Post, make_excerpt
+from app.schemas import PostUpdate
+from tests.conftest import TestingSessionLocal, engine
 
 
 class TestPosts:
@@ -52,6 +60,23 @@ class TestPosts:
         assert isinstance(data, list)
         assert len(data) >= 1
 
+    def test_get_posts_pagination(self, client, auth_headers, test_user):
+        """Test that skip and limit are applied as bound parameters."""
+        for i in range(5):
+            client.post(
+                "/api/v1/posts/",
+                json={"title": f"Post {i}", "content": "Content."},
+                headers=auth_headers,
+            )
+
+        page = client.get("/api/v1/posts/?skip=1&limit=2").json()
+        user_page = client.get(
+            f"/api/v1/posts/user/{test_user.id}?skip=3&limit=10"
+        ).json()
+
+        assert [post["title"] for post in page] == ["Post 1", "Post 2"]
+        assert [post["title"] for post in user_page] == ["Post 3", "Post 4"]
+
     def test_get_posts_published_only(self, client, auth_headers):
         """Test getting only published posts."""
         # Create published post
@@ -230,3 +255,449 @@ class TestPosts:
         data = response.json()
         assert isinstance(data, list)
         assert len(data) >= 2
+
+    def test_update_post_if_match(self, client, auth_headers):
+        """Test conditional updates with If-Match and the post's ETag."""
+        post_data = {"title": "Original", "content": "Content.", "published": False}
+        create_response = client.post(
+            "/api/v1/posts/", json=post_data, headers=auth_headers
+        )
+        post_id = create_response.json()["id"]
+        etag = create_response.headers["ETag"]
+        assert client.get(f"/api/v1/posts/{post_id}").headers["ETag"] == etag
+
+        response = client.put(
+            f"/api/v1/posts/{post_id}",
+            json={"title": "First edit"},
+            headers={**auth_headers, "If-Match": etag},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        assert response.json()["version"] == 2
+
+        # A second editor still holding the old ETag loses
+        response = client.put(
+            f"/api/v1/posts/{post_id}",
+            json={"title": "Stale edit"},
+            headers={**auth_headers, "If-Match": etag},
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        assert client.get(f"/api/v1/posts/{post_id}").json()["title"] == "First edit"
+
+    def test_update_post_if_match_any(self, client, auth_headers):
+        """Test that If-Match: * and a missing header update unconditionally."""
+        post_data = {"title": "Original", "content": "Content.", "published": False}
+        create_response = client.post(
+            "/api/v1/posts/", json=post_data, headers=auth_headers
+        )
+        post_id = create_response.json()["id"]
+
+        response = client.put(
+            f"/api/v1/posts/{post_id}",
+            json={"title": "Any"},
+            headers={**auth_headers, "If-Match": "*"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        response = client.put(
+            f"/api/v1/posts/{post_id}", json={"title": "None"}, headers=auth_headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["version"] == 3
+
+    def test_concurrent_update_conflict(self, db_session, test_user):
+        """Test that a write based on a stale read fails instead of clobbering."""
+        post = Post(title="Original", content="Content.", author_id=test_user.id)
+        db_session.add(post)
+        db_session.commit()
+
+        with TestingSessionLocal() as other:
+            update_post(other, post.id, PostUpdate(title="Winner"))
+
+        with pytest.raises(VersionConflictError):
+            update_post(db_session, post.id, PostUpdate(title="Loser"), if_match={1})
+        db_session.expire_all()
+        assert db_session.get(Post, post.id).title == "Winner"
+
+    def test_patch_post_single_update(self, client, auth_headers, sql_statements):
+        """Test that PATCH writes only supplied fields in one UPDATE."""
+        post_data = {"title": "Original", "content": "Big body.", "published": False}
+        create_response = client.post(
+            "/api/v1/posts/", json=post_data, headers=auth_headers
+        )
+        post_id = create_response.json()["id"]
+
+        with sql_statements:
+            response = client.patch(
+                f"/api/v1/posts/{post_id}",
+                json={"title": "Patched"},
+                headers=auth_headers,
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["title"] == "Patched"
+        assert data["version"] == 2
+        assert data["updated_at"] is not None
+        assert "content" not in data
+        updates = [s for s in sql_statements if s.startswith("UPDATE posts")]
+        assert len(updates) == 1
+        assert "content" not in updates[0].split("RETURNING")[0]
+        assert client.get(f"/api/v1/posts/{post_id}").json()["content"] == "Big body."
+
+    def test_patch_post_publish_updates_counters(self, client, auth_headers, test_user):
+        """Test that publishing via PATCH keeps the author's counters right."""
+        create_response = client.post(
+            "/api/v1/posts/",
+            json={"title": "Draft", "content": "Content."},
+            headers=auth_headers,
+        )
+        post_id = create_response.json()["id"]
+
+        for _ in range(2):
+            response = client.patch(
+                f"/api/v1/posts/{post_id}",
+                json={"published": True},
+                headers=auth_headers,
+            )
+            assert response.json()["published"] is True
+
+        stats = client.get(f"/api/v1/users/{test_user.id}/stats").json()
+        assert stats["published_count"] == 1
+
+    def test_patch_post_errors(self, client, auth_headers, test_user2):
+        """Test PATCH responses for missing, foreign and stale posts."""
+        assert (
+            client.patch(
+                "/api/v1/posts/999", json={"title": "x"}, headers=auth_headers
+            ).status_code
+            == status.HTTP_404_NOT_FOUND
+        )
+
+        create_response = client.post(
+            "/api/v1/posts/",
+            json={"title": "Mine", "content": "Content."},
+            headers=auth_headers,
+        )
+        post_id = create_response.json()["id"]
+        response = client.patch(
+            f"/api/v1/posts/{post_id}",
+            json={"title": "x"},
+            headers={**auth_headers, "If-Match": '"7"'},
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+        login_response = client.post(
+            "/api/v1/auth/login",
+            data={"username": "testuser2", "password": "testpassword2"},
+        )
+        user2_headers = {
+            "Authorization": f"Bearer {login_response.json()['access_token']}"
+        }
+        response = client.patch(
+            f"/api/v1/posts/{post_id}", json={"title": "x"}, headers=user2_headers
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_batch_get_posts(self, client, auth_headers, sql_statements):
+        """Test fetching several posts in order with one query."""
+        ids = [
+            client.post(
+                "/api/v1/posts/",
+                json={"title": f"Post {i}", "content": "Content."},
+                headers=auth_headers,
+            ).json()["id"]
+            for i in range(3)
+        ]
+        requested = [ids[2], 999, ids[0], ids[2]]
+
+        with sql_statements:
+            response = client.get(
+                f"/api/v1/posts/batch?ids={','.join(map(str, requested))}"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [post["id"] for post in data["items"]] == [ids[2], ids[0]]
+        assert data["items"][0]["author"]["username"] == "testuser"
+        assert data["missing"] == [999]
+        assert len([s for s in sql_statements if s.startswith("SELECT")]) == 1
+
+    def test_batch_get_posts_invalid_ids(self, client, monkeypatch):
+        """Test validation of the ids parameter."""
+        monkeypatch.setattr("app.routers.common.settings.batch_max_ids", 2)
+
+        assert client.get("/api/v1/posts/batch?ids=1,x").status_code == 422
+        assert client.get("/api/v1/posts/batch?ids=1,2,3").status_code == 422
+        assert client.get("/api/v1/posts/batch").status_code == 422
+
+
+class TestPostContent:
+    """Test excerpts, deferred loading and compression of post bodies."""
+
+    def test_lists_include_content_by_default(self, client, auth_headers):
+        """Test that list endpoints keep returning full posts."""
+        client.post(
+            "/api/v1/posts/",
+            json={"title": "Full", "content": "Whole body.", "published": True},
+            headers=auth_headers,
+        )
+
+        for url in ("/api/v1/posts/", "/api/v1/posts/my/posts"):
+            item = client.get(url, headers=auth_headers).json()[0]
+            assert item["content"] == "Whole body."
+            assert item["excerpt"] == "Whole body."
+
+    def test_summary_lists_do_not_load_content(
+        self, client, auth_headers, sql_statements
+    ):
+        """Test that `fields=summary` returns an excerpt and never selects content."""
+        content = "Lorem ipsum dolor sit amet. " * 100
+        client.post(
+            "/api/v1/posts/",
+            json={"title": "Long", "content": content, "published": True},
+            headers=auth_headers,
+        )
+        with sql_statements:
+            response = client.get("/api/v1/posts/?fields=summary")
+
+        item = response.json()[0]
+        assert "content" not in item
+        assert item["excerpt"].startswith("Lorem ipsum dolor sit amet.")
+        assert len(item["excerpt"]) <= settings.post_excerpt_length
+        assert not any("posts.content" in statement for statement in sql_statements)
+
+    def test_excerpt_follows_content(self, client, auth_headers):
+        """Test that PATCH regenerates the excerpt along with the content."""
+        response = client.post(
+            "/api/v1/posts/",
+            json={"title": "Post", "content": "Old body."},
+            headers=auth_headers,
+        )
+        post_id = response.json()["id"]
+
+        response = client.patch(
+            f"/api/v1/posts/{post_id}",
+            json={"content": "  New\n\nbody.  "},
+            headers=auth_headers,
+        )
+
+        assert response.json()["excerpt"] == "New body."
+
+    def test_make_excerpt_cuts_at_word_boundary(self):
+        """Test that long excerpts end on a whole word."""
+        assert make_excerpt("one two three four", length=12) == "one two…"
+        assert make_excerpt("short", length=12) == "short"
+
+    def test_large_content_is_compressed(self, client, auth_headers, monkeypatch):
+        """Test that large bodies are stored compressed and read back intact."""
+        monkeypatch.setattr(settings, "post_content_compression", True)
+        monkeypatch.setattr(settings, "post_content_compression_threshold", 1024)
+        content = "All work and no play makes Jack a dull boy. " * 200
+        response = client.post(
+            "/api/v1/posts/",
+            json={"title": "Big", "content": content},
+            headers=auth_headers,
+        )
+        post_id = response.json()["id"]
+
+        with engine.connect() as conn:
+            stored = conn.execute(
+                text("SELECT content FROM posts WHERE id = :id"), {"id": post_id}
+            ).scalar_one()
+        assert stored.startswith(b"\x00")
+        assert len(stored) < len(content) // 10
+        assert client.get(f"/api/v1/posts/{post_id}").json()["content"] == content
+
+
+class TestFeed:
+    """Test the materialized published feed."""
+
+    def _create(self, client, auth_headers, title, published=True):
+        response = client.post(
+            "/api/v1/posts/",
+            json={"title": title, "content": "Content.", "published": published},
+            headers=auth_headers,
+        )
+        return response.json()["id"]
+
+    def test_feed_follows_publishing(self, client, auth_headers):
+        """Test that publishing, retitling and unpublishing update the feed."""
+        first = self._create(client, auth_headers, "First")
+        draft = self._create(client, auth_headers, "Draft", published=False)
+
+        feed = client.get("/api/v1/posts/feed").json()
+        assert [item["post_id"] for item in feed] == [first]
+        assert feed[0]["author_username"] == "testuser"
+
+        client.put(
+            f"/api/v1/posts/{draft}", json={"published": True}, headers=auth_headers
+        )
+        client.patch(
+            f"/api/v1/posts/{first}", json={"title": "Renamed"}, headers=auth_headers
+        )
+        feed = client.get("/api/v1/posts/feed").json()
+        assert [item["post_id"] for item in feed] == [draft, first]
+        assert feed[1]["title"] == "Renamed"
+
+        client.patch(
+            f"/api/v1/posts/{draft}", json={"published": False}, headers=auth_headers
+        )
+        client.delete(f"/api/v1/posts/{first}", headers=auth_headers)
+        assert client.get("/api/v1/posts/feed").json() == []
+
+    def test_feed_follows_author_rename(self, client, auth_headers, test_user):
+        """Test that renaming a user updates their feed entries."""
+        self._create(client, auth_headers, "Post")
+
+        client.patch(
+            f"/api/v1/users/{test_user.id}",
+            json={"username": "renamed"},
+            headers=auth_headers,
+        )
+
+        feed = client.get("/api/v1/posts/feed").json()
+        assert feed[0]["author_username"] == "renamed"
+
+    def test_feed_keyset_pagination(self, client, auth_headers):
+        """Test paging through the feed with `before`."""
+        ids = [self._create(client, auth_headers, f"Post {i}") for i in range(5)]
+
+        first_page = client.get("/api/v1/posts/feed?limit=2").json()
+        second_page = client.get(
+            f"/api/v1/posts/feed?limit=2&before={first_page[-1]['position']}"
+        ).json()
+
+        assert [item["post_id"] for item in first_page] == ids[:2:-1]
+        assert [item["post_id"] for item in second_page] == ids[2:0:-1]
+        assert client.get("/api/v1/posts/feed?limit=0").status_code == 422
+
+    def test_rebuild_feed(self, client, auth_headers, db_session, monkeypatch, capsys):
+        """Test that the rebuild command restores a lost feed."""
+        self._create(client, auth_headers, "One")
+        self._create(client, auth_headers, "Two", published=False)
+        self._create(client, auth_headers, "Three")
+        db_session.query(FeedEntry).delete()
+        db_session.commit()
+        monkeypatch.setattr("app.cli.SessionLocal", TestingSessionLocal)
+
+        cli_main(["rebuild-feed"])
+
+        feed = client.get("/api/v1/posts/feed").json()
+        assert [item["title"] for item in feed] == ["Three", "One"]
+        assert "Rebuilt the published feed with 2 posts" in capsys.readouterr().out
+
+
+class TestPostTags:
+    """Test tagging posts and filtering by tag."""
+
+    def _create(self, client, auth_headers, title, tags, published=True):
+        response = client.post(
+            "/api/v1/posts/",
+            json={
+                "title": title,
+                "content": "Content.",
+                "published": published,
+                "tags": tags,
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.json()
+
+    def test_create_normalizes_tags(self, client, auth_headers):
+        """Test that tags are lower-cased, de-duplicated and sorted."""
+        post = self._create(client, auth_headers, "Tagged", ["Web", " python", "web"])
+
+        assert post["tags"] == ["python", "web"]
+        assert client.get(f"/api/v1/posts/{post['id']}").json()["tags"] == [
+            "python",
+            "web",
+        ]
+
+    def test_too_many_tags_rejected(self, client, auth_headers):
+        """Test validation of the tag list."""
+        response = client.post(
+            "/api/v1/posts/",
+            json={"title": "x", "content": "x", "tags": [str(i) for i in range(11)]},
+            headers=auth_headers,
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_update_replaces_tags(self, client, auth_headers):
+        """Test that PUT and PATCH replace tags and bump the version."""
+        post = self._create(client, auth_headers, "Tagged", ["a", "b"])
+
+        response = client.put(
+            f"/api/v1/posts/{post['id']}",
+            json={"tags": ["b", "c"]},
+            headers=auth_headers,
+        )
+        assert response.json()["tags"] == ["b", "c"]
+        assert response.json()["version"] == 2
+
+        response = client.patch(
+            f"/api/v1/posts/{post['id']}", json={"tags": []}, headers=auth_headers
+        )
+        assert response.json()["version"] == 3
+        assert response.json()["tags"] == []
+        assert client.get(f"/api/v1/posts/{post['id']}").json()["tags"] == []
+
+    def test_null_tags_left_unchanged(self, client, auth_headers):
+        """Test that `tags: null` keeps the tags on PUT and PATCH."""
+        post = self._create(client, auth_headers, "Tagged", ["a"])
+        url = f"/api/v1/posts/{post['id']}"
+
+        response = client.put(url, json={"tags": None}, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["tags"] == ["a"]
+
+        response = client.patch(
+            url, json={"title": "Renamed", "tags": None}, headers=auth_headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["tags"] == ["a"]
+
+    def test_skip_rejected_with_tag(self, client, auth_headers):
+        """Test that offset paging is refused for tag lists."""
+        self._create(client, auth_headers, "Tagged", ["a"])
+
+        response = client.get("/api/v1/posts/?tag=a&skip=1")
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert client.get("/api/v1/posts/?tag=a&skip=0").status_code == 200
+
+    def test_before_rejected_without_tag(self, client, auth_headers):
+        """Test that keyset paging is refused for the untagged listing."""
+        post = self._create(client, auth_headers, "Tagged", ["a"])
+
+        response = client.get(f"/api/v1/posts/?before={post['id']}")
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_filter_by_tag_keyset(self, client, auth_headers):
+        """Test tag filtering newest first, paged with `before`."""
+        ids = [
+            self._create(client, auth_headers, f"Post {i}", ["python"])["id"]
+            for i in range(5)
+        ]
+        self._create(client, auth_headers, "Other", ["rust"])
+        self._create(client, auth_headers, "Draft", ["python"], published=False)
+
+        first = client.get("/api/v1/posts/?tag=Python&limit=2&published_only=true")
+        page = [post["id"] for post in first.json()]
+        assert page == [ids[4], ids[3]]
+
+        second = client.get(
+            f"/api/v1/posts/?tag=python&limit=10&before={page[-1]}&published_only=true"
+        )
+        assert [post["id"] for post in second.json()] == [ids[2], ids[1], ids[0]]
+
+    def test_list_loads_tags_in_one_query(self, client, auth_headers, sql_statements):
+        """Test that a page of posts loads its tags with a single query."""
+        for i in range(5):
+            self._create(client, auth_headers, f"Post {i}", [f"tag{i}", "common"])
+        with sql_statements:
+            response = client.get("/api/v1/posts/?tag=common")
+
+        assert [post["tags"][0] for post in response.json()] == ["common"] * 5
+        assert len([s for s in sql_statements if "FROM post_tags" in s]) == 1
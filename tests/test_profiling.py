@@ -0,0 +1,88 @@
+import time
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.profiling import ProfilingMiddleware
+
+
+@pytest.fixture
+def profiled_client(client, monkeypatch, tmp_path):
+    """A client for the app wrapped in the profiling middleware."""
+    monkeypatch.setattr(settings, "profiler_token", "s3cret")
+    monkeypatch.setattr(settings, "profiler_interval_ms", 1)
+    monkeypatch.setattr(settings, "profiler_output_dir", str(tmp_path))
+
+    def slow_get_posts(db, **kwargs):
+        time.sleep(0.05)
+        return []
+
+    monkeypatch.setattr("app.routers.posts.get_posts", slow_get_posts)
+    monkeypatch.setattr(settings, "read_coalescing_enabled", False)
+    return TestClient(ProfilingMiddleware(app))
+
+
+class TestProfiling:
+    """Test opt-in per-request profiling."""
+
+    def test_disabled_by_default(self):
+        """Test that the middleware is not installed unless enabled."""
+        assert not settings.profiler_enabled
+        assert all(m.cls is not ProfilingMiddleware for m in app.user_middleware)
+
+    def test_profile_returned_as_attachment(self, profiled_client):
+        """Test that an authorized request can download its collapsed stacks."""
+        response = profiled_client.get(
+            "/api/v1/posts/",
+            headers={"X-Profile": "s3cret", "X-Profile-Output": "attachment"},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["X-Profiled-Status"] == "200"
+        assert "attachment" in response.headers["Content-Disposition"]
+        lines = response.text.splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) >= 1
+        assert any("app.routers.posts.read_posts" in line for line in lines)
+
+    def test_profile_written_to_directory(self, profiled_client, tmp_path):
+        """Test that sampled requests keep their response and write a file."""
+        response = profiled_client.get(
+            "/api/v1/posts/", headers={"X-Profile": "s3cret"}
+        )
+
+        assert response.json() == []
+        assert (tmp_path / response.headers["X-Profile-File"]).read_text()
+
+    def test_wrong_token_is_ignored(self, profiled_client, tmp_path):
+        """Test that requests without the admin token are not profiled."""
+        response = profiled_client.get(
+            "/api/v1/posts/",
+            headers={"X-Profile": "guess", "X-Profile-Output": "attachment"},
+        )
+
+        assert response.json() == []
+        assert "X-Profile-File" not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+    def test_sample_rate(self, profiled_client, monkeypatch, tmp_path):
+        """Test that a sample rate profiles requests without any header."""
+        monkeypatch.setattr(settings, "profiler_sample_rate", 1.0)
+
+        response = profiled_client.get("/api/v1/posts/")
+
+        assert response.json() == []
+        assert len(list(tmp_path.iterdir())) == 1
+
+    def test_sampled_request_does_not_name_profile(self, profiled_client, monkeypatch):
+        """Test that only token holders learn where a profile was written."""
+        monkeypatch.setattr(settings, "profiler_sample_rate", 1.0)
+
+        response = profiled_client.get("/api/v1/posts/", headers={"X-Profile": "guess"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-Profile-File" not in response.headers
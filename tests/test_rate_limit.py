@@ -0,0 +1,120 @@
+import time
+
+from fastapi import status
+
+from app.config import settings
+from app.rate_limit import InMemoryRateLimitStore, login_ip_limiter, signup_ip_limiter
+
+
+class TestTokenBucket:
+    """Test the in-memory token bucket store."""
+
+    def test_consume_until_empty(self):
+        """Test that a bucket allows its burst and then rejects."""
+        store = InMemoryRateLimitStore()
+
+        results = [store.consume("key", capacity=3, refill_rate=1) for _ in range(4)]
+
+        assert [allowed for allowed, _ in results] == [True, True, True, False]
+        assert 0 < results[-1][1] <= 1
+
+    def test_buckets_are_independent(self):
+        """Test that keys do not share tokens."""
+        store = InMemoryRateLimitStore()
+
+        assert store.consume("a", capacity=1, refill_rate=1)[0]
+        assert not store.consume("a", capacity=1, refill_rate=1)[0]
+        assert store.consume("b", capacity=1, refill_rate=1)[0]
+
+    def test_prune_keeps_buckets_within_their_own_window(self):
+        """Test that pruning uses each bucket's own refill time."""
+        store = InMemoryRateLimitStore(max_keys=1)
+
+        store.consume("slow", capacity=1, refill_rate=1 / 3600)
+        store.consume("fast", capacity=1, refill_rate=1000)
+        time.sleep(0.01)
+        store.consume("other", capacity=1, refill_rate=1000)
+
+        assert not store.consume("slow", capacity=1, refill_rate=1 / 3600)[0]
+        assert "fast" not in store._buckets
+
+
+class TestRateLimitedEndpoints:
+    """Test throttling of the auth endpoints."""
+
+    def test_login_throttled_per_ip(self, client, monkeypatch):
+        """Test that excess login attempts get 429 before authentication."""
+        monkeypatch.setattr(login_ip_limiter, "capacity", 2)
+        calls = []
+        monkeypatch.setattr(
+            "app.routers.auth.authenticate_user",
+            lambda db, username, password: calls.append(username),
+        )
+
+        for i in range(2):
+            client.post(
+                "/api/v1/auth/login", data={"username": f"u{i}", "password": "x"}
+            )
+        response = client.post(
+            "/api/v1/auth/login", data={"username": "u3", "password": "x"}
+        )
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response.headers["Retry-After"]) >= 1
+        assert calls == ["u0", "u1"]
+
+    def test_login_throttled_per_username(self, client, test_user):
+        """Test that a single username is throttled independently of the IP."""
+        login_data = {"username": "testuser", "password": "wrongpassword"}
+        responses = [
+            client.post("/api/v1/auth/login", data=login_data) for _ in range(11)
+        ]
+
+        assert responses[-2].status_code == status.HTTP_401_UNAUTHORIZED
+        assert responses[-1].status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        response = client.post(
+            "/api/v1/auth/login", data={"username": "other", "password": "x"}
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_signup_throttled_per_ip(self, client, monkeypatch):
+        """Test that excess signups get 429 with a Retry-After header."""
+        monkeypatch.setattr(signup_ip_limiter, "capacity", 1)
+        user_data = {
+            "email": "first@example.com",
+            "username": "first",
+            "password": "password123",
+        }
+        assert client.post("/api/v1/auth/signup", json=user_data).status_code == 201
+
+        user_data = {
+            "email": "second@example.com",
+            "username": "second",
+            "password": "password123",
+        }
+        response = client.post("/api/v1/auth/signup", json=user_data)
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert "Retry-After" in response.headers
+
+    def test_spoofed_forwarded_for_is_ignored(self, client, monkeypatch):
+        """Test that only the hop added by the trusted proxy is believed."""
+        monkeypatch.setattr(settings, "rate_limit_trust_proxy", True)
+        monkeypatch.setattr(signup_ip_limiter, "capacity", 1)
+
+        responses = [
+            client.post(
+                "/api/v1/auth/signup",
+                json={
+                    "email": f"user{i}@example.com",
+                    "username": f"user{i}",
+                    "password": "password123",
+                },
+                headers={"X-Forwarded-For": f"10.0.0.{i}, 203.0.113.7"},
+            )
+            for i in range(2)
+        ]
+
+        assert responses[0].status_code == status.HTTP_201_CREATED
+        assert responses[1].status_code == status.HTTP_429_TOO_MANY_REQUESTS
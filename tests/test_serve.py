@@ -0,0 +1,70 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app import serve
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestServe:
+    """Test the production server entrypoint."""
+
+    def test_worker_count_from_settings(self, monkeypatch):
+        """Test that WEB_CONCURRENCY overrides the CPU-based default."""
+        monkeypatch.setattr(serve.settings, "web_concurrency", 3)
+        assert serve.worker_count() == 3
+
+        monkeypatch.setattr(serve.settings, "web_concurrency", None)
+        assert serve.worker_count() == serve.available_cpus() >= 1
+
+    @pytest.mark.skipif(serve.BaseApplication is None, reason="requires gunicorn")
+    def test_boots_multiple_workers(self, tmp_path):
+        """Smoke test: start the server with two workers and hit /health."""
+        port = _free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{tmp_path / 'serve.db'}",
+            WEB_CONCURRENCY="2",
+            PORT=str(port),
+            SERVER_HOST="127.0.0.1",
+            BCRYPT_ROUNDS="4",
+            PYTHONPATH=str(ROOT),
+        )
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "app.serve"],
+            cwd=tmp_path,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    response = httpx.get(f"http://127.0.0.1:{port}/health")
+                    break
+                except httpx.TransportError:
+                    if proc.poll() is not None or time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.2)
+            assert response.status_code == 200
+        finally:
+            proc.terminate()
+            output, _ = proc.communicate(timeout=30)
+
+        assert output.count("Booting worker") == 2
+        assert "Using worker: app.serve.UvicornWorker" in output
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from fastapi import status
+
+from app.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test coalescing of identical concurrent calls."""
+
+    def _run_concurrently(self, flight, fn, count=10):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("key", fn)))
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that callers arriving during a call wait for its result."""
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"value": 42}
+
+        results = self._run_concurrently(SingleFlight(), slow)
+
+        assert len(calls) == 1
+        assert results == [{"value": 42}] * 10
+
+    def test_exceptions_are_shared(self):
+        """Test that every waiting caller sees the leader's exception."""
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def failing():
+            started.set()
+            release.wait()
+            raise ValueError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                flight.do("key", failing)
+            except ValueError as exc:
+                errors.append(exc)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+
+        assert len(errors) == 2
+        assert errors[0] is errors[1]
+        # Failures are not reused afterwards
+        assert flight.do("key", lambda: "ok") == "ok"
+
+    def test_window_and_forget(self):
+        """Test that results are reused within the window until forgotten."""
+        flight = SingleFlight(window=60)
+        assert flight.do("key", lambda: 1) == 1
+        assert flight.do("key", lambda: 2) == 1
+
+        flight.forget("key")
+
+        assert flight.do("key", lambda: 3) == 3
+        assert SingleFlight().do("key", lambda: 4) == 4
+
+
+class TestCoalescedEndpoints:
+    """Test that coalesced post reads stay fresh after writes."""
+
+    def test_read_after_write_is_fresh(self, client, auth_headers, monkeypatch):
+        """Test that a write in this worker discards shared read results."""
+        monkeypatch.setattr("app.routers.posts.reads.window", 60)
+        response = client.post(
+            "/api/v1/posts/",
+            json={"title": "Before", "content": "Content."},
+            headers=auth_headers,
+        )
+        post_id = response.json()["id"]
+        assert client.get(f"/api/v1/posts/{post_id}").json()["title"] == "Before"
+        assert client.get("/api/v1/posts/").json()[0]["title"] == "Before"
+
+        client.patch(
+            f"/api/v1/posts/{post_id}", json={"title": "After"}, headers=auth_headers
+        )
+
+        response = client.get(f"/api/v1/posts/{post_id}")
+        assert response.json()["title"] == "After"
+        assert response.headers["ETag"] == '"2"'
+        assert client.get("/api/v1/posts/").json()[0]["title"] == "After"
+        client.delete(f"/api/v1/posts/{post_id}", headers=auth_headers)
+        assert (
+            client.get(f"/api/v1/posts/{post_id}").status_code
+            == status.HTTP_404_NOT_FOUND
+        )
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app import broker as broker_module
+from app.broker import Broker, BrokerEvent, event_stream
+
+
+def _event(event_id, post_id=1):
+    return BrokerEvent(event_id, "post.published", {"post_id": post_id})
+
+
+async def _take(stream, count):
+    return [await asyncio.wait_for(stream.__anext__(), 1) for _ in range(count)]
+
+
+class TestBroker:
+    """Test the in-process pub/sub broker behind GET /posts/stream."""
+
+    @pytest.mark.asyncio
+    async def test_live_events(self):
+        """Test that subscribers receive events published after they connect."""
+        broker = Broker()
+        stream = event_stream(broker=broker)
+        assert (await _take(stream, 1))[0].startswith("retry:")
+
+        broker.deliver(_event(10, post_id=5))
+        chunk = (await _take(stream, 1))[0]
+        await stream.aclose()
+
+        assert chunk.startswith("id: 10\nevent: post.published\n")
+        assert json.loads(chunk.split("data: ")[1]) == {"post_id": 5}
+        assert not broker.subscribers
+
+    @pytest.mark.asyncio
+    async def test_resume_from_last_event_id(self):
+        """Test that reconnecting with Last-Event-ID replays missed events."""
+        broker = Broker()
+        for event_id in (1, 2, 3):
+            broker.deliver(_event(event_id))
+
+        stream = event_stream(last_event_id=1, broker=broker)
+        chunks = await _take(stream, 3)
+        await stream.aclose()
+
+        assert [chunk.split("\n")[0] for chunk in chunks[1:]] == ["id: 2", "id: 3"]
+
+    @pytest.mark.asyncio
+    async def test_reset_when_replay_buffer_is_exceeded(self):
+        """Test that a client too far behind is told to refetch."""
+        broker = Broker(replay_size=2)
+        for event_id in (1, 2, 3, 4):
+            broker.deliver(_event(event_id))
+
+        stream = event_stream(last_event_id=1, broker=broker)
+        chunks = await _take(stream, 4)
+        await stream.aclose()
+
+        assert chunks[1].startswith("event: reset")
+        assert [chunk.split("\n")[0] for chunk in chunks[2:]] == ["id: 3", "id: 4"]
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_is_disconnected(self):
+        """Test that a consumer whose queue overflows has its stream ended."""
+        broker = Broker(subscriber_queue_size=2)
+        stream = event_stream(broker=broker)
+        await _take(stream, 1)
+
+        for event_id in range(1, 6):
+            broker.deliver(_event(event_id))
+
+        with pytest.raises(StopAsyncIteration):
+            await asyncio.wait_for(stream.__anext__(), 1)
+        assert not broker.subscribers
+
+    def test_publishing_a_post_reaches_the_broker(
+        self, client, auth_headers, monkeypatch
+    ):
+        """Test that creating and later publishing posts feeds the broker."""
+        monkeypatch.setattr(broker_module, "_use_postgres_notify", lambda: False)
+        before = len(broker_module.broker.buffer)
+
+        client.post(
+            "/api/v1/posts/",
+            json={"title": "Live", "content": "Content.", "published": True},
+            headers=auth_headers,
+        )
+        draft = client.post(
+            "/api/v1/posts/",
+            json={"title": "Draft", "content": "Content."},
+            headers=auth_headers,
+        ).json()
+        client.patch(
+            f"/api/v1/posts/{draft['id']}",
+            json={"published": True},
+            headers=auth_headers,
+        )
+
+        deadline = time.monotonic() + 5
+        while len(broker_module.broker.buffer) < before + 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        titles = [event.data["title"] for event in broker_module.broker.buffer]
+        assert titles[-2:] == ["Live", "Draft"]
+
+    @pytest.mark.asyncio
+    async def test_postgres_publish_reaches_listeners(self, pg_session):
+        """Test numbering and relaying events through NOTIFY on PostgreSQL."""
+        listener = asyncio.create_task(broker_module.listen_postgres())
+        received = []
+        try:
+            async with broker_module.broker.subscribe() as subscription:
+                # The listener connects in the background; publish until it hears
+                for _ in range(20):
+                    await broker_module.publish_post({"post_id": 7})
+                    try:
+                        received.append(await asyncio.wait_for(subscription.get(), 0.5))
+                        break
+                    except asyncio.TimeoutError:
+                        continue
+                await broker_module.publish_post({"post_id": 8})
+                while received[-1].data != {"post_id": 8}:
+                    received.append(await asyncio.wait_for(subscription.get(), 5))
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+        assert received[0].data == {"post_id": 7}
+        assert received[-1].id > received[0].id
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import tasks
+from app.models import OutboxEvent
+from app.tasks import Job, TaskQueue, emit, task_queue
+from tests.conftest import TestingSessionLocal
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting for background task"
+        time.sleep(0.01)
+
+
+async def _async_wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting for background task"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    """Collect post events handled by the application's task queue."""
+    events = []
+    monkeypatch.setitem(
+        task_queue.handlers,
+        "post.created",
+        [lambda payload: events.append(("post.created", payload))],
+    )
+    monkeypatch.setitem(
+        task_queue.handlers,
+        "post.updated",
+        [lambda payload: events.append(("post.updated", payload))],
+    )
+    return events
+
+
+class TestTaskQueue:
+    """Test the background task queue."""
+
+    def test_post_writes_enqueue_events(self, client, auth_headers, handled):
+        """Test that post writes are handled in the background after commit."""
+        response = client.post(
+            "/api/v1/posts/",
+            json={"title": "Title", "content": "Content."},
+            headers=auth_headers,
+        )
+        post_id = response.json()["id"]
+        client.put(
+            f"/api/v1/posts/{post_id}", json={"published": True}, headers=auth_headers
+        )
+
+        _wait_for(lambda: len(handled) == 2)
+        assert handled[0] == (
+            "post.created",
+            {"post_id": post_id, "author_id": 1, "published": False},
+        )
+        assert handled[1][1]["changed"] == ["published"]
+
+    def test_rollback_discards_events(self, client, db_session, handled):
+        """Test that events from a rolled back transaction are never handled."""
+        emit(db_session, "post.created", {"post_id": 1})
+        db_session.rollback()
+        emit(db_session, "post.created", {"post_id": 2})
+        db_session.commit()
+
+        _wait_for(lambda: len(handled) == 1)
+        assert handled[0][1] == {"post_id": 2}
+
+    @pytest.mark.asyncio
+    async def test_retries_with_backoff(self):
+        """Test that failing handlers are retried until they succeed."""
+        queue = TaskQueue(workers=1, max_retries=3, retry_backoff=0.01)
+        calls = []
+
+        @queue.register("flaky")
+        async def flaky(payload):
+            calls.append(payload)
+            if len(calls) < 3:
+                raise RuntimeError("boom")
+
+        await queue.start()
+        queue.submit(Job("flaky", {"n": 1}))
+        await _async_wait_for(lambda: len(calls) == 3)
+        await queue.stop()
+
+        assert calls == [{"n": 1}] * 3
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        """Test that a job is dropped once its retries are exhausted."""
+        queue = TaskQueue(workers=1, max_retries=2, retry_backoff=0.01)
+        calls = []
+
+        @queue.register("broken")
+        def broken(payload):
+            calls.append(payload)
+            raise RuntimeError("boom")
+
+        await queue.start()
+        queue.submit(Job("broken", {}))
+        await _async_wait_for(lambda: len(calls) == 3)
+        await asyncio.sleep(0.1)
+        await queue.stop()
+
+        assert len(calls) == 3
+
+
+class TestOutbox:
+    """Test the durable SQL outbox."""
+
+    @pytest.mark.asyncio
+    async def test_outbox_row_marked_processed(self, db_session, monkeypatch):
+        """Test that outbox events are written with the transaction and completed."""
+        queue = TaskQueue(workers=1, session_factory=TestingSessionLocal)
+        handled = []
+        queue.register("post.created")(handled.append)
+        monkeypatch.setattr(tasks, "task_queue", queue)
+        monkeypatch.setattr(tasks.settings, "task_outbox_enabled", True)
+
+        await queue.start()
+        emit(db_session, "post.created", {"post_id": 7})
+        db_session.commit()
+        await _async_wait_for(lambda: handled)
+        await queue.stop()
+
+        row = db_session.query(OutboxEvent).one()
+        db_session.refresh(row)
+        assert json.loads(row.payload) == {"post_id": 7}
+        assert row.processed_at is not None
+
+    @pytest.mark.asyncio
+    async def test_outbox_replays_lost_events(self, db_session):
+        """Test that unprocessed outbox rows are picked up by the poller."""
+        db_session.add(
+            OutboxEvent(
+                event="post.created",
+                payload=json.dumps({"post_id": 3}),
+                attempts=0,
+                created_at=datetime.now(timezone.utc) - timedelta(minutes=5),
+            )
+        )
+        db_session.commit()
+        queue = TaskQueue(
+            workers=1, session_factory=TestingSessionLocal, outbox_poll_interval=0.05
+        )
+        handled = []
+        queue.register("post.created")(handled.append)
+
+        await queue.start()
+        await _async_wait_for(lambda: handled)
+        await queue.stop()
+
+        assert handled == [{"post_id": 3}]
+
+    @pytest.mark.asyncio
+    async def test_outbox_update_failure_keeps_worker_alive(self):
+        """Test that a failed outbox write is logged and the worker goes on."""
+
+        def broken_session():
+            raise RuntimeError("database down")
+
+        queue = TaskQueue(
+            workers=1, session_factory=broken_session, outbox_poll_interval=3600
+        )
+        handled = []
+        queue.register("post.created")(handled.append)
+
+        await queue.start()
+        queue.submit(Job("post.created", {"post_id": 1}, outbox_id=1))
+        queue.submit(Job("post.created", {"post_id": 2}))
+        await _async_wait_for(lambda: len(handled) == 2)
+        await queue.stop()
+
+        assert handled == [{"post_id": 1}, {"post_id": 2}]
+
+    def test_outbox_rows_claimed_once(self, db_session):
+        """Test that concurrent pollers never claim the same row."""
+        db_session.add_all(
+            [
+                OutboxEvent(event="post.created", payload="{}", attempts=0),
+                OutboxEvent(
+                    event="post.created",
+                    payload="{}",
+                    attempts=0,
+                    claimed_at=datetime.now(timezone.utc) - timedelta(hours=1),
+                ),
+                OutboxEvent(
+                    event="post.created",
+                    payload="{}",
+                    attempts=0,
+                    claimed_at=datetime.now(timezone.utc),
+                ),
+            ]
+        )
+        db_session.commit()
+        first = TaskQueue(session_factory=TestingSessionLocal)
+        second = TaskQueue(session_factory=TestingSessionLocal)
+
+        claimed = first._claim_outbox(set())
+
+        assert [job.outbox_id for job in claimed] == [1, 2]
+        assert second._claim_outbox(set()) == []
+
+    def test_processed_outbox_rows_purged(self, db_session):
+        """Test that the poller deletes rows processed before the retention."""
+        now = datetime.now(timezone.utc)
+        db_session.add_all(
+            [
+                OutboxEvent(
+                    event="old", payload="{}", processed_at=now - timedelta(days=8)
+                ),
+                OutboxEvent(
+                    event="new", payload="{}", processed_at=now - timedelta(days=1)
+                ),
+                OutboxEvent(event="pending", payload="{}"),
+            ]
+        )
+        db_session.commit()
+        queue = TaskQueue(session_factory=TestingSessionLocal)
+
+        assert queue._purge_outbox() == 1
+        assert [row.event for row in db_session.query(OutboxEvent)] == [
+            "new",
+            "pending",
+        ]
@@ -0,0 +1,161 @@
+import pytest
+from fastapi import status
+from sqlalchemy.exc import IntegrityError
+
+from app.auth import create_refresh_token
+from app.cli import main as cli_main
+from app.crud import update_user
+from app.models import Post, RefreshToken, User
+from app.schemas import UserUpdate
+from tests.conftest import TestingSessionLocal
+
+
+class TestUsers:
+    """Test user endpoints."""
+
+    def test_get_user_by_id(self, client, test_user):
+        """Test getting a specific user by ID."""
+        response = client.get(f"/api/v1/users/{test_user.id}")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["username"] == "testuser"
+
+    def test_batch_get_users(self, client, test_user, test_user2):
+        """Test fetching several users by ID in the requested order."""
+        response = client.get(
+            f"/api/v1/users/batch?ids={test_user2.id},42,{test_user.id}"
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [user["username"] for user in data["items"]] == [
+            "testuser2",
+            "testuser",
+        ]
+        assert data["missing"] == [42]
+
+    def test_patch_user(self, client, auth_headers, test_user):
+        """Test partially updating the current user."""
+        response = client.patch(
+            f"/api/v1/users/{test_user.id}",
+            json={"username": "renamed"},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["username"] == "renamed"
+        assert data["email"] == "test@example.com"
+        assert "hashed_password" not in data
+
+    def test_patch_user_duplicate_username(
+        self, client, auth_headers, test_user, test_user2
+    ):
+        """Test that PATCH maps unique violations to the usual 400 messages."""
+        response = client.patch(
+            f"/api/v1/users/{test_user.id}",
+            json={"username": "testuser2"},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Username already taken" in response.json()["detail"]
+
+    def test_failed_update_keeps_refresh_tokens(
+        self, db_session, test_user, test_user2
+    ):
+        """Test that a password change revokes tokens only if the update commits."""
+        create_refresh_token(db_session, test_user.id)
+
+        with pytest.raises(IntegrityError):
+            update_user(
+                db_session,
+                test_user.id,
+                UserUpdate(username="testuser2", password="newpassword"),
+            )
+        db_session.rollback()
+
+        token = db_session.query(RefreshToken).one()
+        assert token.revoked_at is None
+
+    def test_delete_user_cascades_posts(
+        self, client, auth_headers, test_user, db_session
+    ):
+        """Test that deleting a user removes their posts in the database."""
+        for i in range(3):
+            client.post(
+                "/api/v1/posts/",
+                json={"title": f"Post {i}", "content": "Content."},
+                headers=auth_headers,
+            )
+        assert db_session.query(Post).filter_by(author_id=test_user.id).count() == 3
+
+        response = client.delete(f"/api/v1/users/{test_user.id}", headers=auth_headers)
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert db_session.query(Post).filter_by(author_id=test_user.id).count() == 0
+        assert client.get(f"/api/v1/users/{test_user.id}").status_code == 404
+
+    def test_delete_other_user_forbidden(self, client, auth_headers, test_user2):
+        """Test deleting another user's account."""
+        response = client.delete(f"/api/v1/users/{test_user2.id}", headers=auth_headers)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestUserStats:
+    """Test the denormalized per-author post counters."""
+
+    def test_counters_follow_post_writes(self, client, auth_headers, test_user):
+        """Test that creating, publishing and deleting posts updates counters."""
+        ids = []
+        for published in (True, False, False):
+            response = client.post(
+                "/api/v1/posts/",
+                json={"title": "Post", "content": "Content.", "published": published},
+                headers=auth_headers,
+            )
+            ids.append(response.json()["id"])
+        client.put(
+            f"/api/v1/posts/{ids[1]}", json={"published": True}, headers=auth_headers
+        )
+        client.delete(f"/api/v1/posts/{ids[0]}", headers=auth_headers)
+
+        response = client.get(f"/api/v1/users/{test_user.id}/stats")
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["post_count"] == 2
+        assert data["published_count"] == 1
+        assert data["draft_count"] == 1
+        # Post writes are not edits of the author's profile
+        assert client.get(f"/api/v1/users/{test_user.id}").json()["updated_at"] is None
+        assert data["last_post_at"] is not None
+        user = client.get(f"/api/v1/users/{test_user.id}").json()
+        assert user["post_count"] == 2
+
+    def test_stats_user_not_found(self, client):
+        """Test stats for a non-existent user."""
+        response = client.get("/api/v1/users/999/stats")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_reconcile_counters(self, db_session, test_user, monkeypatch, capsys):
+        """Test that the reconciliation command rebuilds drifted counters."""
+        db_session.add_all(
+            [
+                Post(title="A", content="a", published=True, author_id=test_user.id),
+                Post(title="B", content="b", published=False, author_id=test_user.id),
+            ]
+        )
+        db_session.commit()
+        monkeypatch.setattr("app.cli.SessionLocal", TestingSessionLocal)
+
+        cli_main(["reconcile-counters"])
+
+        user = db_session.get(User, test_user.id, populate_existing=True)
+        assert user.post_count == 2
+        assert user.published_count == 1
+        assert user.last_post_at is not None
+        assert user.updated_at is None
+        assert "Reconciled post counters for 1 users" in capsys.readouterr().out
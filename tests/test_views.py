@@ -0,0 +1,76 @@
+import pytest
+
+from app.models import Post
+from app.routers.posts import reads as post_reads
+from app.views import ViewCounter, view_counter
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(autouse=True)
+def empty_view_counter():
+    """Start and end every test with no buffered views."""
+    view_counter._pending.clear()
+    yield
+    view_counter._pending.clear()
+
+
+class TestViewCounts:
+    """Test buffered, write-behind post view counters."""
+
+    def test_views_are_buffered_then_flushed(self, client, auth_headers, db_session):
+        """Test that reads only count in memory until the batch is written."""
+        response = client.post(
+            "/api/v1/posts/",
+            json={"title": "Viral", "content": "Content."},
+            headers=auth_headers,
+        )
+        post_id = response.json()["id"]
+        other_id = client.post(
+            "/api/v1/posts/",
+            json={"title": "Other", "content": "Content."},
+            headers=auth_headers,
+        ).json()["id"]
+        for _ in range(3):
+            client.get(f"/api/v1/posts/{post_id}")
+        client.get(f"/api/v1/posts/{other_id}")
+
+        assert view_counter.pending() == {post_id: 3, other_id: 1}
+        assert db_session.get(Post, post_id).view_count == 0
+
+        assert view_counter.flush() == 2
+
+        post = db_session.get(Post, post_id, populate_existing=True)
+        assert post.view_count == 3
+        assert post.version == 1
+        assert post.updated_at is None
+        assert view_counter.pending() == {}
+        post_reads.forget()
+        assert client.get(f"/api/v1/posts/{post_id}").json()["view_count"] == 3
+
+    def test_failed_flush_keeps_views(self, db_session):
+        """Test that views survive a flush that cannot reach the database."""
+
+        def broken_session():
+            raise RuntimeError("database down")
+
+        counter = ViewCounter(broken_session)
+        counter.record(1)
+        counter.record(1)
+
+        with pytest.raises(RuntimeError):
+            counter.flush()
+
+        counter.record(1)
+        assert counter.pending() == {1: 3}
+        counter.session_factory = TestingSessionLocal
+        assert counter.flush() == 1
+
+    def test_full_buffer_requests_early_flush(self):
+        """Test that too many distinct posts trigger a flush before the interval."""
+        counter = ViewCounter(TestingSessionLocal, max_pending=2)
+        counter.record(1)
+        assert not counter._full.is_set()
+
+        counter.record(2)
+
+        assert counter._full.is_set()